@@ -1,19 +1,24 @@
 import pygame
 
-from pyc64.cpu import CPU
+from pyc64.cpu import CPU, PRINTABLE_ASCII, FLAG_N, FLAG_V, FLAG_B, FLAG_D, FLAG_I, FLAG_Z, FLAG_C
 from pyc64.bus import Bus
-from pyc64.peripherals.cia import C64_KEY_MAP # Import the key mapping
+from pyc64.peripherals.cia import C64_KEY_LUT, c64_key_index # Import the key mapping
 import numpy as np
 import sys
 import datetime
+import queue
+import threading
 import imageio
 
 NUM_SAVE_SLOTS = 6 # Number of save state slots (F7-F12)
-SAVE_STATE_FILENAMES = [f"pyc64_state_{i}.json" for i in range(1, NUM_SAVE_SLOTS + 1)]
+SAVE_STATE_FILENAMES = [f"pyc64_state_{i}.state" for i in range(1, NUM_SAVE_SLOTS + 1)]
 
 EMU_VERSION = "0.9.0" # Current emulator version
 REPO_URL = "https://github.com/aabate/py6502emu_gemini" # Placeholder for project repository
 
+TEXT_CACHE_SIZE = 512 # Rendered text surfaces kept by draw_text()
+INPUT_POLLS_PER_FRAME = 4 # Times input is handled while a frame is emulated
+
 class EmulatorGUI:
     def __init__(self):
         pygame.init()
@@ -27,6 +32,14 @@ class EmulatorGUI:
         # --- Pygame Audio Setup ---
         pygame.mixer.pre_init(44100, -16, 2, 512) # SampleRate, BitSize, 2 Channels (Stereo), BufferSize
         pygame.mixer.init()
+        # One frame of audio is 735 stereo samples (44100 Hz / 60 fps). Three sounds are
+        # refilled in turn and queued on one channel, instead of making a new Sound every frame.
+        # Channel 0 is reserved, so other sounds never take it from the emulator
+        pygame.mixer.set_reserved(1)
+        self.audio_channel = pygame.mixer.Channel(0)
+        self.audio_sounds = [pygame.mixer.Sound(buffer=bytes(735 * 2 * 2)) for _ in range(3)]
+        self.audio_samples = [pygame.sndarray.samples(sound) for sound in self.audio_sounds]
+        self.audio_sound_index = 0
 
         # --- Pygame Setup ---
         self.C64_SCREEN_WIDTH = 320
@@ -41,6 +54,14 @@ class EmulatorGUI:
         pygame.display.set_caption("pyC64emu - A Pygame based C64 Emulator")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("monospace", 15)
+        # The C64 screen scaled to the window, redrawn only when it is stale
+        self.scaled_c64_surface = pygame.Surface((self.C64_SCREEN_WIDTH, self.C64_SCREEN_HEIGHT))
+        # Rendered text surfaces by (text, color). Most panel lines are the same every frame.
+        self.text_cache = {}
+
+        # Only the event types handled in run() are queued by SDL
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.DROPFILE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED])
 
         # --- Colors ---
         self.COLOR_BG = (40, 40, 40)
@@ -51,6 +72,10 @@ class EmulatorGUI:
         self.is_recording = False
         self.video_writer = None
         self.video_filename = "pyc64_recording.mp4"
+        # Frames waiting for the encoder thread, which runs while recording
+        self.frame_queue = None
+        self.encoder_thread = None
+        self.encoder_failed = False # Set by the encoder thread if writing a frame fails
         self.turbo_mode = False
         self.audio_buffer_for_vis = None
         self.show_visualizers = True
@@ -66,12 +91,23 @@ class EmulatorGUI:
         self.current_info_page_index = 0
         self.show_help_screen = False
 
+        # Partial display updates: the lines drawn by draw_text() in this frame and the
+        # last one, as ((text, color), rect). full_update forces a flip of the whole window.
+        self.drawn_text = []
+        self.last_drawn_text = []
+        self.full_update = True
+
         prg_file_to_load = sys.argv[1] if len(sys.argv) > 1 else None
         self.reset_and_load(prg_file_to_load)
 
     def reset_and_load(self, prg_file=None):
         """Resets the emulator and loads the C64 ROMs."""
+        self.full_update = True
         self.memory_view_addr = 0x0200  # Default start address for memory view
+        # Disassembled GUI lines by address: (instruction bytes, text, length)
+        self.disasm_cache = {}
+        # The old CPU may still hold batched trace lines
+        self.cpu.close_trace()
         self.cpu = CPU(None)
         self.bus = Bus(self.cpu)
         self.cpu.bus = self.bus
@@ -93,105 +129,164 @@ class EmulatorGUI:
             print(f"Error during ROM loading: {e}")
         self.running = True # Ensure emulator is running after a reset
         
-    def run(self):
-        """The main loop of the emulator."""
-        app_running = True
-        while app_running:
-            # --- Event Handling ---
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    app_running = False
+    def handle_events(self):
+        """Handles the pending pygame events. Closing the window clears self.app_running."""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.app_running = False
                 
-                if event.type == pygame.DROPFILE:
-                    self.reset_and_load(event.file)
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_F5: # F5 to Run/Stop
-                        self.running = not self.running
-                    if event.key == pygame.K_F6 and not self.running: # F6 to Step
-                        self.cpu.tick()
-                    if event.key == pygame.K_F9: # F9 to toggle recording
-                        self.toggle_recording()
-                    if event.key == pygame.K_F10: # F10 to take a screenshot
-                        self.take_screenshot()
-                    if event.key == pygame.K_TAB: # Tab to cycle info panel pages
-                        self.current_info_page_index = (self.current_info_page_index + 1) % len(self.info_pages)
-
-                    if event.key == pygame.K_RETURN:
-                        if self.info_pages[self.current_info_page_index] == "CPU State":
-                            self.set_register_value()
+            if event.type == pygame.DROPFILE:
+                self.reset_and_load(event.file)
+
+            if event.type == pygame.WINDOWEXPOSED:
+                # Uncovered or restored: partial updates would leave the rest of the window stale
+                self.full_update = True
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F5: # F5 to Run/Stop
+                    self.running = not self.running
+                if event.key == pygame.K_F6 and not self.running: # F6 to Step
+                    self.cpu.tick()
+                if event.key == pygame.K_F9: # F9 to toggle recording
+                    self.toggle_recording()
+                if event.key == pygame.K_F10: # F10 to take a screenshot
+                    self.take_screenshot()
+                if event.key == pygame.K_TAB: # Tab to cycle info panel pages
+                    self.current_info_page_index = (self.current_info_page_index + 1) % len(self.info_pages)
+                    self.full_update = True # The old page may have drawn more than text
+
+                if event.key == pygame.K_RETURN:
+                    if self.info_pages[self.current_info_page_index] == "CPU State":
+                        self.set_register_value()
                 
-                if event.type == pygame.VIDEORESIZE:
-                    # Update window dimensions
-                    self.WINDOW_WIDTH, self.WINDOW_HEIGHT = event.size
-                    self.screen = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT), pygame.RESIZABLE) # Recreate screen with new size and RESIZABLE flag
-
-                    # Calculate new C64 screen dimensions maintaining aspect ratio
-                    # Available width for C64 screen is total width minus info panel width
-                    available_c64_width = self.WINDOW_WIDTH - self.INFO_PANEL_WIDTH
+            if event.type == pygame.VIDEORESIZE:
+                # Update window dimensions
+                self.WINDOW_WIDTH, self.WINDOW_HEIGHT = event.size
+                self.screen = pygame.display.set_mode((self.WINDOW_WIDTH, self.WINDOW_HEIGHT), pygame.RESIZABLE) # Recreate screen with new size and RESIZABLE flag
+
+                # Calculate new C64 screen dimensions maintaining aspect ratio
+                # Available width for C64 screen is total width minus info panel width
+                available_c64_width = self.WINDOW_WIDTH - self.INFO_PANEL_WIDTH
                     
-                    # Calculate scale factors based on available space
-                    scale_factor_w = available_c64_width / self.initial_c64_width
-                    scale_factor_h = self.WINDOW_HEIGHT / self.initial_c64_height
+                # Calculate scale factors based on available space
+                scale_factor_w = available_c64_width / self.initial_c64_width
+                scale_factor_h = self.WINDOW_HEIGHT / self.initial_c64_height
                     
-                    # Use the smaller scale factor to fit both dimensions
-                    scale_factor = min(scale_factor_w, scale_factor_h)
-                    self.C64_SCREEN_WIDTH = int(self.initial_c64_width * scale_factor)
-                    self.C64_SCREEN_HEIGHT = int(self.initial_c64_height * scale_factor)
+                # Use the smaller scale factor to fit both dimensions
+                scale_factor = min(scale_factor_w, scale_factor_h)
+                self.C64_SCREEN_WIDTH = int(self.initial_c64_width * scale_factor)
+                self.C64_SCREEN_HEIGHT = int(self.initial_c64_height * scale_factor)
                     
-                    # Ensure minimum size for C64 screen to avoid division by zero or tiny screen
-                    if self.C64_SCREEN_WIDTH < 100: self.C64_SCREEN_WIDTH = 100
-                    if self.C64_SCREEN_HEIGHT < 100: self.C64_SCREEN_HEIGHT = 100
-
-                if event.type == pygame.KEYUP:
-                    if event.key in C64_KEY_MAP:
-                        row, col = C64_KEY_MAP[event.key]
-                        self.bus.cia1.set_key_state(row, col, False)
-                        # print(f"Key {pygame.key.name(event.key)} released (C64 Row {row}, Col {col})")
-
-
-                    if event.key == pygame.K_F12: # F12 to Reset
-                        self.reset_and_load(sys.argv[1] if len(sys.argv) > 1 else None)
-
-            # --- Emulation Core ---
-            if self.running and not self.show_help_screen: # Pause emulation when help is shown
-                # Run a batch of CPU cycles per frame to keep emulation speed stable
-                # PAL C64 runs at 985248 cycles per second. At 60fps, that's ~16420 cycles/frame.
-                cycles_per_frame = 16420 
-                for _ in range(cycles_per_frame):
-                    self.cpu.tick()
+                # Ensure minimum size for C64 screen to avoid division by zero or tiny screen
+                if self.C64_SCREEN_WIDTH < 100: self.C64_SCREEN_WIDTH = 100
+                if self.C64_SCREEN_HEIGHT < 100: self.C64_SCREEN_HEIGHT = 100
+
+                self.scaled_c64_surface = pygame.Surface((self.C64_SCREEN_WIDTH, self.C64_SCREEN_HEIGHT))
+                self.bus.vic.frame_dirty = True
+                self.full_update = True
+
+            if event.type == pygame.KEYUP:
+                packed = C64_KEY_LUT[c64_key_index(event.key)]
+                if packed != 0xFF:
+                    self.bus.cia1.set_key_state(packed >> 3, packed & 7, False)
+                    # print(f"Key {pygame.key.name(event.key)} released (C64 Row {packed >> 3}, Col {packed & 7})")
+
+
+                if event.key == pygame.K_F12: # F12 to Reset
+                    self.reset_and_load(sys.argv[1] if len(sys.argv) > 1 else None)
+
+    def run(self):
+        """The main loop of the emulator."""
+        self.app_running = True
+        try:
+            while self.app_running:
+                # --- Event Handling ---
+                self.handle_events()
+
+                # --- Emulation Core ---
+                if self.running and not self.show_help_screen: # Pause emulation when help is shown
+                    # Run a batch of CPU cycles per frame to keep emulation speed stable
+                    # PAL C64 runs at 985248 cycles per second. At 60fps, that's ~16420 cycles/frame.
+                    cycles_per_frame = 16420
+                    # The frame runs in slices with input handled in between, so a key pressed
+                    # while the frame is being emulated reaches the CIA in the same frame.
+                    slice_cycles = cycles_per_frame // INPUT_POLLS_PER_FRAME
+                    for i in range(INPUT_POLLS_PER_FRAME):
+                        if i:
+                            self.handle_events()
+                            if not (self.app_running and self.running) or self.show_help_screen:
+                                break
+                        self.cpu.run_cycles(slice_cycles)
                 
-                # --- Audio ---
-                # Generate and play a short audio buffer only when running
-                audio_buffer = self.bus.sid.generate_audio_buffer(735) # 44100 / 60fps
-                self.audio_buffer_for_vis = audio_buffer # Store for visualizer
-                audio_buffer = np.repeat(audio_buffer[:, np.newaxis], 2, axis=1)
-                sound = pygame.sndarray.make_sound(audio_buffer)
-                sound.play()
-
-            # --- Drawing ---
-            self.screen.fill(self.COLOR_BG)
-
-            # Always draw the main screen and info panel
-            c64_screen_surface = self.bus.vic.get_screen_surface()
-            scaled_c64_surface = pygame.transform.scale(c64_screen_surface, (self.C64_SCREEN_WIDTH, self.C64_SCREEN_HEIGHT))
-            self.screen.blit(scaled_c64_surface, (0, 0))
-            self.draw_info_panel(self.C64_SCREEN_WIDTH + 10)
-
-            # If help is active, draw it as an overlay
-            if self.show_help_screen:
-                self.draw_help_screen()
-
-            pygame.display.flip()
-
-            # --- Video Recording ---
-            if self.is_recording and self.video_writer:
-                # Grab the frame from the screen
-                frame_data = pygame.surfarray.array3d(self.screen)
-                # imageio expects (height, width, channels), pygame gives (width, height, channels)
-                # so we need to transpose it.
-                frame_data = frame_data.transpose([1, 0, 2])
-                self.video_writer.append_data(frame_data)
+                    # --- Audio ---
+                    # Generate and play a short audio buffer only when running
+                    # The SID writes straight into both channels of the next sound in the ring.
+                    # When frames are emulated faster than they play, queue() replaces the waiting
+                    # sound, so the one still playing can be any slot. That slot is skipped.
+                    if self.audio_sounds[self.audio_sound_index] is self.audio_channel.get_sound():
+                        self.audio_sound_index = (self.audio_sound_index + 1) % len(self.audio_sounds)
+                    samples = self.audio_samples[self.audio_sound_index]
+                    self.bus.sid.generate_audio_buffer(735, out=samples) # 44100 / 60fps
+                    self.audio_buffer_for_vis = samples[:, 0] # Store for visualizer
+                    self.audio_channel.queue(self.audio_sounds[self.audio_sound_index])
+                    self.audio_sound_index = (self.audio_sound_index + 1) % len(self.audio_sounds)
+
+                # --- Drawing ---
+                self.screen.fill(self.COLOR_BG)
+
+                # Always draw the main screen and info panel
+                # The C64 screen is only rescaled when the VIC has drawn to it or the window changed size
+                vic = self.bus.vic
+                c64_screen_changed = vic.frame_dirty
+                if c64_screen_changed:
+                    pygame.transform.scale(vic.get_screen_surface(), (self.C64_SCREEN_WIDTH, self.C64_SCREEN_HEIGHT), self.scaled_c64_surface)
+                    vic.frame_dirty = False
+                self.screen.blit(self.scaled_c64_surface, (0, 0))
+                self.drawn_text = []
+                self.draw_info_panel(self.C64_SCREEN_WIDTH + 10)
+
+                # If help is active, draw it as an overlay
+                if self.show_help_screen:
+                    self.draw_help_screen()
+
+                # Only the C64 screen and the text lines that differ from the last frame are
+                # sent to the display. The overlay and the visualizers draw more than text,
+                # so they update the whole window.
+                if (self.full_update or self.show_help_screen
+                        or self.info_pages[self.current_info_page_index] == "Visualizers"):
+                    pygame.display.flip()
+                    self.full_update = False
+                else:
+                    dirty_rects = [self.scaled_c64_surface.get_rect()] if c64_screen_changed else []
+                    last_drawn_text = self.last_drawn_text
+                    for i in range(max(len(last_drawn_text), len(self.drawn_text))):
+                        old = last_drawn_text[i] if i < len(last_drawn_text) else None
+                        new = self.drawn_text[i] if i < len(self.drawn_text) else None
+                        if old != new:
+                            if old: dirty_rects.append(old[1])
+                            if new: dirty_rects.append(new[1])
+                    pygame.display.update(dirty_rects)
+                self.last_drawn_text = self.drawn_text
+
+                # --- Video Recording ---
+                if self.is_recording and self.video_writer:
+                    # Grab the frame from the screen
+                    pixels = pygame.surfarray.pixels3d(self.screen)
+                    # imageio expects (height, width, channels), pygame gives (width, height, channels)
+                    # so we need to transpose it. The frame is copied once, straight into that layout.
+                    frame_data = np.ascontiguousarray(pixels.transpose([1, 0, 2]))
+                    del pixels # Unlock the screen surface
+                    # Encoding runs on the encoder thread. The queue is bounded, so this only
+                    # waits if the encoder falls several frames behind.
+                    self.frame_queue.put(frame_data)
+                    if self.encoder_failed:
+                        self.stop_recording()
+        finally:
+            # Also runs on an exception or Ctrl-C, when the end of the trace matters most
+            if self.is_recording:
+                self.stop_recording()
+            # Write out whatever the instruction trace still holds in its buffer
+            self.cpu.close_trace()
 
     def draw_info_panel(self, x_start_offset):
         x_offset = x_start_offset
@@ -218,15 +313,16 @@ class EmulatorGUI:
             y_offset += 5
 
             # --- Flags ---
+            p = self.cpu.p
             flags_str = (
-                ('N' if self.cpu.n else '-') +
-                ('V' if self.cpu.v else '-') +
+                ('N' if p & FLAG_N else '-') +
+                ('V' if p & FLAG_V else '-') +
                 '-' +
-                ('B' if self.cpu.b else '-') +
-                ('D' if self.cpu.d else '-') +
-                ('I' if self.cpu.i else '-') +
-                ('Z' if self.cpu.z else '-') +
-                ('C' if self.cpu.c else '-')
+                ('B' if p & FLAG_B else '-') +
+                ('D' if p & FLAG_D else '-') +
+                ('I' if p & FLAG_I else '-') +
+                ('Z' if p & FLAG_Z else '-') +
+                ('C' if p & FLAG_C else '-')
             )
             y_offset = self.draw_text("--- Flags ---", x_offset, y_offset)
             y_offset = self.draw_text(f"NV-BDIZC", x_offset, y_offset)
@@ -248,42 +344,24 @@ class EmulatorGUI:
                 if temp_addr > 0xFFFF:
                     break
                 
-                line = self.disassemble_line(temp_addr)
+                line, length = self.disassemble_line(temp_addr)
                 is_current_pc = (temp_addr == self.cpu.pc)
                 y_offset = self.draw_text(line, x_offset, y_offset, self.COLOR_HL if is_current_pc else self.COLOR_FG)
-
-                opcode = self.bus.read(temp_addr)
-                if opcode in self.cpu.commands:
-                    mode = self.cpu.commands[opcode]['m']
-                    temp_addr += self.cpu.increments.get(mode, 1)
-                else:
-                    temp_addr += 1
+                temp_addr += length
 
         elif current_page_name == "Memory Viewer":
             y_offset = self.draw_text(f"Current Address: ${self.memory_view_addr:04X}", x_offset, y_offset)
             y_offset += 5
 
-            # Display 16 rows of 16 bytes each (256 bytes total)
-            for i in range(16):
-                start_addr = self.memory_view_addr
-                addr = start_addr + (i * 16)
-                if addr > 0xFFFF:
-                    break
-                
-                line_hex = f"${addr:04X}: "
-                hex_part = []
-                ascii_part = []
-                for j in range(16):
-                    byte_addr = addr + j
-                    if byte_addr <= 0xFFFF:
-                        byte = self.bus.read(byte_addr)
-                        hex_part.append(f"{byte:02X}")
-                        ascii_part.append(chr(byte) if 0x20 <= byte <= 0x7E else '.')
-                    else:
-                        hex_part.append("  ")
-                        ascii_part.append(" ")
-                
-                line_hex += ' '.join(hex_part) + " |" + ''.join(ascii_part) + "|"
+            # Display 16 rows of 16 bytes each (256 bytes total), read in one block.
+            # Rows running past $FFFF are padded with blanks.
+            start_addr = self.memory_view_addr
+            data = self.bus.read_block(start_addr, min(start_addr + 256, 0x10000))
+            for i in range(0, len(data), 16):
+                row = data[i:i + 16]
+                hex_part = row.hex(' ').upper().ljust(47)
+                ascii_part = row.translate(PRINTABLE_ASCII).decode('ascii').ljust(16)
+                line_hex = f"${start_addr + i:04X}: {hex_part} |{ascii_part}|"
                 y_offset = self.draw_text(line_hex, x_offset, y_offset)
             
             y_offset += 5
@@ -392,20 +470,19 @@ class EmulatorGUI:
         max_height = 80
 
         try:
-            # Perform FFT
-            fft_data = np.fft.fft(self.audio_buffer_for_vis)
-            fft_magnitude = np.abs(fft_data)[:len(fft_data)//2] # We only need the first half
+            # Perform FFT. The samples are real, so rfft() only computes the first half.
+            num_samples = len(self.audio_buffer_for_vis)
+            fft_magnitude = np.abs(np.fft.rfft(self.audio_buffer_for_vis))[:num_samples//2]
 
             # Group FFT bins into bars (logarithmic grouping can be better, but linear is simpler)
             bins_per_bar = len(fft_magnitude) // num_bars
             if bins_per_bar == 0: return
 
-            for i in range(num_bars):
-                start_bin = i * bins_per_bar
-                end_bin = (i + 1) * bins_per_bar
-                bar_magnitude = np.mean(fft_magnitude[start_bin:end_bin])
+            # Average each group of bins in one go and normalize to bar heights
+            bar_magnitudes = fft_magnitude[:num_bars * bins_per_bar].reshape(num_bars, bins_per_bar).mean(axis=1)
+            bar_heights = np.minimum(max_height, (bar_magnitudes / 5000.0) * max_height).astype(np.int32)
 
-                bar_height = min(max_height, int((bar_magnitude / 5000.0) * max_height)) # Normalize
+            for i, bar_height in enumerate(bar_heights.tolist()):
                 pygame.draw.rect(self.screen, self.COLOR_HL, (x + i * (bar_width + bar_spacing), y + max_height - bar_height, bar_width, bar_height))
         except Exception:
             # Avoid crashing if there's an issue with FFT data
@@ -423,18 +500,16 @@ class EmulatorGUI:
         # Draw the center line
         pygame.draw.line(self.screen, (80, 80, 80), (x, mid_y), (x + vis_width, mid_y))
 
-        # Prepare points for the line graph
-        points = []
+        # Prepare points for the line graph, one sample per pixel column
         num_samples = len(self.audio_buffer_for_vis)
         if num_samples == 0: return
 
-        for i in range(vis_width):
-            sample_index = int(i * num_samples / vis_width)
-            sample_value = self.audio_buffer_for_vis[sample_index]
-            
-            # Normalize sample value (-32768 to 32767) to the height of the scope
-            normalized_y = mid_y - (sample_value / 32768.0) * (max_height / 2)
-            points.append((x + i, normalized_y))
+        columns = np.arange(vis_width)
+        sample_values = self.audio_buffer_for_vis[(columns * num_samples / vis_width).astype(np.intp)]
+
+        # Normalize sample values (-32768 to 32767) to the height of the scope
+        normalized_y = mid_y - (sample_values / 32768.0) * (max_height / 2)
+        points = np.column_stack((x + columns, normalized_y)).tolist()
 
         pygame.draw.lines(self.screen, self.COLOR_HL, False, points, 1)
 
@@ -468,7 +543,7 @@ class EmulatorGUI:
         y_offset = self.draw_text("F9:  Start/Stop Video Recording", x_offset, y_offset)
         for i in range(NUM_SAVE_SLOTS):
             slot_number = i + 1
-            y_offset = self.draw_text(f"F{slot_number+6}: Load State {slot_number} (pyc64_state_{slot_number}.json)", x_offset, y_offset)
+            y_offset = self.draw_text(f"F{slot_number+6}: Load State {slot_number} (pyc64_state_{slot_number}.state)", x_offset, y_offset)
         y_offset = self.draw_text("F11: Toggle Turbo Mode", x_offset, y_offset) # Moved to Controls page
         y_offset = self.draw_text("F10: Take Screenshot", x_offset, y_offset)
         y_offset = self.draw_text("F12: Reset Emulator", x_offset, y_offset)
@@ -483,6 +558,10 @@ class EmulatorGUI:
     def start_recording(self):
         try:
             self.video_writer = imageio.get_writer(self.video_filename, fps=60, codec='libx264', quality=8)
+            self.frame_queue = queue.Queue(maxsize=4)
+            self.encoder_failed = False
+            self.encoder_thread = threading.Thread(target=self.encode_frames, args=(self.video_writer, self.frame_queue), daemon=True)
+            self.encoder_thread.start()
             self.is_recording = True
             print(f"--- Started recording to '{self.video_filename}' ---")
         except Exception as e:
@@ -490,12 +569,39 @@ class EmulatorGUI:
             print("Please ensure 'imageio' and 'imageio-ffmpeg' are installed (`pip install imageio imageio-ffmpeg`)")
             self.video_writer = None
 
+    def encode_frames(self, video_writer, frame_queue):
+        """Runs on the encoder thread: writes queued frames to the video until it gets None."""
+        while True:
+            frame_data = frame_queue.get()
+            if frame_data is None:
+                break
+            if self.encoder_failed:
+                continue # Keep draining the queue so the main loop never blocks on it
+            try:
+                video_writer.append_data(frame_data)
+            except Exception as e:
+                print(f"Error writing video frame: {e}")
+                self.encoder_failed = True
+
     def stop_recording(self):
+        if self.encoder_thread:
+            # Let the encoder finish the frames already queued
+            self.frame_queue.put(None)
+            self.encoder_thread.join()
+            self.encoder_thread = None
+            self.frame_queue = None
         if self.video_writer:
-            self.video_writer.close()
-            print(f"--- Video recording saved to '{self.video_filename}' ---")
+            try:
+                self.video_writer.close()
+                if not self.encoder_failed:
+                    print(f"--- Video recording saved to '{self.video_filename}' ---")
+            except Exception as e:
+                print(f"Error closing video recording: {e}")
+            if self.encoder_failed:
+                print(f"--- Video recording to '{self.video_filename}' stopped after an error ---")
         self.is_recording = False
         self.video_writer = None
+        self.encoder_failed = False
 
     def take_screenshot(self):
         """Saves the current screen content to a timestamped PNG file."""
@@ -514,7 +620,7 @@ class EmulatorGUI:
         self.cpu._save_state(filename)
         self.running = was_running # Restore running state
 
-    def load_emulator_state(self, filename="pyc64_state.json"):
+    def load_emulator_state(self, filename="pyc64_state.state"):
         """Loads the complete state of the emulator."""
         self.running = False # Pause emulation during load
         self.cpu._restore_state(filename)
@@ -523,45 +629,38 @@ class EmulatorGUI:
         """Renders a line of text and returns the y-offset for the next line."""
         if color is None:
             color = self.COLOR_FG
-        text_surface = self.font.render(text, True, color)
-        self.screen.blit(text_surface, (x, y))
+        key = (text, color)
+        text_surface = self.text_cache.get(key)
+        if text_surface is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE:
+                # Drop the oldest entry; dicts keep insertion order
+                del self.text_cache[next(iter(self.text_cache))]
+            text_surface = self.font.render(text, True, color)
+            self.text_cache[key] = text_surface
+        self.drawn_text.append((key, self.screen.blit(text_surface, (x, y))))
         return y + self.font.get_height()
     
     def disassemble_line(self, addr):
-        """Disassembles a single instruction at a given address for the GUI."""
-        from pyc64.opcodes import Mode
-        opcode = self.bus.read(addr)
-        
-        if opcode not in self.cpu.commands:
-            return f"${addr:04X}: {opcode:02X}       ???"
-
-        mnemonic = self.cpu.commands[opcode]['f'].__name__
-        mode = self.cpu.commands[opcode]['m']
-        
-        operand_str = ""
-        num_bytes = self.cpu.increments.get(mode, 1)
-
-        if num_bytes == 2:
-            operand = self.bus.read(addr + 1)
-            if mode == Mode.IMMEDIATE: operand_str = f"#${operand:02X}"
-            elif mode == Mode.ZEROPAGE: operand_str = f"${operand:02X}"
-            elif mode == Mode.ZEROPAGEX: operand_str = f"${operand:02X},X"
-            elif mode == Mode.ZEROPAGEY: operand_str = f"${operand:02X},Y"
-            elif mode == Mode.INDIRECTX: operand_str = f"(${operand:02X},X)"
-            elif mode == Mode.INDIRECTY: operand_str = f"(${operand:02X}),Y"
-            elif mode == Mode.RELATIVE:
-                offset = operand if operand < 128 else operand - 256
-                target = addr + 2 + offset
-                operand_str = f"${target:04X}"
-        elif num_bytes == 3:
-            lsb, msb = self.bus.read(addr + 1), self.bus.read(addr + 2)
-            operand = (msb << 8) | lsb
-            if mode == Mode.ABSOLUTE: operand_str = f"${operand:04X}"
-            elif mode == Mode.ABSOLUTEX: operand_str = f"${operand:04X},X"
-            elif mode == Mode.ABSOLUTEY: operand_str = f"${operand:04X},Y"
-            elif mode == Mode.INDIRECT: operand_str = f"(${operand:04X})"
-
-        return f"${addr:04X}: {mnemonic:<4} {operand_str:<10}"
+        """
+        Disassembles a single instruction at a given address for the GUI.
+        Returns the text and the number of bytes the instruction takes.
+        """
+        # The panel shows the same code every frame, so lines are cached by address
+        # and reused for as long as the instruction bytes in memory are unchanged.
+        data = self.bus.read_block(addr, min(addr + 3, 0x10000))
+        cached = self.disasm_cache.get(addr)
+        if cached is not None and data.startswith(cached[0]):
+            return cached[1], cached[2]
+        text, length = self._decode_line(addr, data + bytes(2))
+        self.disasm_cache[addr] = (data[:length], text, length)
+        return text, length
+
+    def _decode_line(self, addr, data):
+        """Formats the instruction in data, which was read from addr, for disassemble_line()."""
+        mnemonic, operand_str, length = self.cpu._decode_instruction(addr, data, 0)
+        if mnemonic is None:
+            return f"${addr:04X}: {data[0]:02X}       ???", 1
+        return f"${addr:04X}: {mnemonic:<4} {operand_str:<10}", length
 
 if __name__ == "__main__":
     app = EmulatorGUI()
@@ -6,38 +6,46 @@ from .peripherals.sid import SID
 from .peripherals.cia import CIA
 from .peripherals.drive import DiskDrive1541
 from .memory import MemoryManager
+import struct
+
+# Prebuilt parsers for the .crt format (all fields are big-endian).
+# Header: signature, header length, version, hardware type, EXROM line, GAME line
+CRT_HEADER = struct.Struct('>16sIHHBB')
+# CHIP packet: signature, packet length, chip type, bank number, load address, ROM size
+CRT_CHIP_HEADER = struct.Struct('>4sIHHHH')
 
 class Cartridge:
     """Represents a C64 cartridge."""
     def __init__(self):
+        # Always present on the Bus; `enabled` tells whether a cartridge is plugged in.
+        self.enabled = False
         self.type = 0
         self.exrom = False
         self.game = False
-        self.rom_chips = {} # Maps address to ROM data list
+        self.rom_chips = {} # Maps load address to ROM data bytes
 
     def load_from_crt(self, filename):
         """Parses a .crt file and loads its data."""
         with open(filename, 'rb') as f:
             # Read CRT header
-            magic = f.read(16)
-            if magic[:4] != b'C64 ':
+            header = f.read(CRT_HEADER.size)
+            if len(header) < CRT_HEADER.size or header[:4] != b'C64 ':
                 raise ValueError("Invalid CRT file magic string.")
-            
-            header_len = struct.unpack('>I', f.read(4))[0]
-            self.type = struct.unpack('>H', f.read(2))[0]
-            self.exrom = (struct.unpack('>B', f.read(1))[0] == 1)
-            self.game = (struct.unpack('>B', f.read(1))[0] == 1)
+
+            _, header_len, _, self.type, exrom, game = CRT_HEADER.unpack(header)
+            self.exrom = (exrom == 1)
+            self.game = (game == 1)
             f.seek(header_len) # Move to the end of the header
 
             # Read CHIP packets
             while True:
-                chip_header = f.read(16)
-                if not chip_header or chip_header[:4] != b'CHIP':
+                chip_header = f.read(CRT_CHIP_HEADER.size)
+                if len(chip_header) < CRT_CHIP_HEADER.size or chip_header[:4] != b'CHIP':
                     break
-                
-                chip_size = struct.unpack('>I', chip_header[8:12])[0]
-                load_addr = struct.unpack('>H', chip_header[14:16])[0]
-                self.rom_chips[load_addr] = list(f.read(chip_size))
+
+                _, _, _, _, load_addr, chip_size = CRT_CHIP_HEADER.unpack(chip_header)
+                self.rom_chips[load_addr] = f.read(chip_size)
+        self.enabled = True
         print(f"Loaded Cartridge '{filename}', Type: {self.type}, GAME: {self.game}, EXROM: {self.exrom}")
 
 class Bus:
@@ -47,12 +55,19 @@ class Bus:
 
         # Memory manager handles RAM, ROMs, and bank switching
         self.memory = MemoryManager(self)
+        # Reads and writes are served by the memory manager directly, which saves
+        # a Python call frame on every bus access.
+        self.read = self.memory.read
+        self.write = self.memory.write
+        self.read_block = self.memory.read_block
+        # The RAM buffer itself, for callers that read plain RAM directly
+        self.ram = self.memory.ram
 
-        # Track memory writes for rewind
-        self.memory_dirty_flags = set()
+        # Pages written since the last rewind capture (maintained by the memory manager)
+        self.dirty_pages = self.memory.dirty_pages
 
-        # Cartridge
-        self.cartridge = None
+        # Cartridge (always a Cartridge object, check `enabled` to see if one is inserted)
+        self.cartridge = Cartridge()
 
         # I/O Devices (Peripherals)
         self.vic = VICII(self, cpu=self.cpu)
@@ -61,15 +76,18 @@ class Bus:
         self.cia2 = CIA("CIA2", cpu=self.cpu)
         self.drive = DiskDrive1541()
 
-    def write(self, address, data):
-        # Delegate write to the memory manager
-        self.memory.write(address, data)
-        # Add address to dirty flags for rewind
-        self.memory_dirty_flags.add(address)
-
-    def read(self, address):
-        # Delegate read to the memory manager
-        return self.memory.read(address)
+    def write_block(self, start_address, data):
+        """Writes a block of bytes, as a single slice copy when the range is plain RAM."""
+        end_address = start_address + len(data)
+        if self.memory.is_ram_range(start_address, end_address):
+            self.memory.ram[start_address:end_address] = data
+            first_page = start_address >> 8
+            last_page = (end_address - 1) >> 8
+            self.dirty_pages[first_page:last_page + 1] = b'\x01' * (last_page - first_page + 1)
+        else:
+            # The range overlaps ROM or I/O, fall back to the regular bus write
+            for i, byte in enumerate(data):
+                self.write(start_address + i, byte)
 
     def load_rom_from_file(self, filename, rom_type):
         """Generic ROM loader."""
@@ -82,7 +100,8 @@ class Bus:
             print(f"Error: {rom_type.upper()} ROM file '{filename}' not found.")
 
     def __getitem__(self, address):
-        return self.read(address)
+        # Convenience for scripts and the debugger; the CPU calls read() directly.
+        return self.memory.read(address)
 
     def load_prg(self, filename):
         """Loads a .prg file into memory."""
@@ -94,8 +113,7 @@ class Bus:
                 load_address = (load_address_msb << 8) | load_address_lsb
 
                 program_data = f.read()
-                for i, byte in enumerate(program_data):
-                    self.write(load_address + i, byte)
+                self.write_block(load_address, program_data)
                 
                 print(f"Loaded .prg file '{filename}' ({len(program_data)} bytes) at ${load_address:04X}.")
                 return load_address
@@ -110,9 +128,8 @@ class Bus:
             self.cartridge.load_from_crt(filename)
         except (ValueError, FileNotFoundError) as e:
             print(f"Error loading cartridge: {e}")
-            self.cartridge = None
+            self.cartridge = Cartridge()
 
     def load_program(self, start_address, program_data):
         """Loads a program into RAM at a specific address."""
-        for i, byte in enumerate(program_data):
-            self.write(start_address + i, byte)
\ No newline at end of file
+        self.write_block(start_address, program_data)
\ No newline at end of file
@@ -2,215 +2,554 @@
 # By @TokyoEdtech
 # REF: http://www.6502.org/tutorials/6502opcodes.html
 from .bus import Bus
-from .opcodes import get_opcode_definitions, CYCLE_COUNTS, INSTRUCTION_INCREMENTS, Mode
+from .opcodes import get_opcode_definitions, CYCLE_COUNTS, INSTRUCTION_INCREMENTS, OPERAND_FORMATS, Mode
+from .memory import RAM_ONLY_START, RAM_ONLY_END, READ_MAP, REGION_BASIC, REGION_KERNAL
+import bisect
 import json
+import pickle
 import sys
+import numpy as np
+try:
+    import readline # Line editing, history and completion for the debugger prompt
+except ImportError: # Not available on every platform
+    readline = None
+
+# Status register bits, in the nvb1dizc layout that PHP pushes
+FLAG_C = 0x01 # Carry
+FLAG_Z = 0x02 # Zero
+FLAG_I = 0x04 # Interrupt disable
+FLAG_D = 0x08 # Decimal
+FLAG_B = 0x20 # Break
+FLAG_V = 0x40 # Overflow
+FLAG_N = 0x80 # Negative
+
+# N and Z bits for every byte value, so the handlers update them with a single table lookup.
+# Negative differences from the compare instructions index from the end,
+# which gives the same bits as their two's complement byte.
+NZ_TABLE = tuple((value & FLAG_N) | (FLAG_Z if value == 0 else 0) for value in range(256))
+
+# Write buffer for trace.log, in bytes
+TRACE_BUFFER_SIZE = 1 << 20
+# Trace lines collected in memory before they are handed to trace.log in one write
+TRACE_BATCH_LINES = 4096
+
+# Help text for the debugger, written out in one go by the help command
+DEBUGGER_HELP = (
+    "Debugger commands:\n"
+    "  s (step)        - Execute current instruction and break on next.\n"
+    "  c (continue)    - Continue execution until next breakpoint.\n"
+    "  b <addr>        - Set a breakpoint (e.g., b 8000).\n"
+    "  b clear <addr>  - Clear a specific breakpoint.\n"
+    "  b clear all     - Clear all breakpoints.\n"
+    "  blist           - List all active breakpoints.\n"
+    "  m <addr> [len]  - Display memory from hex address (e.g., m 0200 32).\n"
+    "  save [filename] - Save emulator state (default: emustate.state).\n"
+    "  load [filename] - Restore emulator state (default: emustate.state).\n"
+    "  h (help)        - Show this help message.\n"
+    "  dasm <addr> [n] - Disassemble n instructions from address (e.g., dasm 8000 5).\n"
+    "  find <b1> [b2]..- Search for a byte sequence in memory (e.g., find A9 20 85 30).\n"
+    "  autodasm        - Toggle automatic disassembly when a breakpoint is hit.\n"
+    "  reg <reg> <value> - Set CPU register to value (e.g., reg a 0A).\n"
+    "  set <addr> <value> - Set memory at hex address to hex value (e.g., set 8000 0A).\n"
+    "  flags           - Show a detailed view of the status flags.\n"
+    "  stack           - Display the current contents of the stack.\n"
+    "  bt              - Show a backtrace of the call stack.\n"
+    "  trace           - Toggle instruction tracing to trace.log.\n"
+    "  cycles          - Show the total cycle count.\n"
+)
+
+# Layout of the flags command, filled in with the N V B D I Z C bits
+FLAGS_VIEW = (
+    "--- CPU Flags ---\n"
+    "  N (Negative) : %d\n"
+    "  V (Overflow) : %d\n"
+    "  - (Unused)   : 1\n"
+    "  B (Break)    : %d\n"
+    "  D (Decimal)  : %d\n"
+    "  I (Interrupt): %d\n"
+    "  Z (Zero)     : %d\n"
+    "  C (Carry)    : %d\n"
+    "-----------------\n"
+)
+
+# Byte to character map for the ASCII column of memory dumps: printable ASCII is kept,
+# everything else becomes '.'
+PRINTABLE_ASCII = bytes(value if 0x20 <= value <= 0x7E else 0x2E for value in range(256))
+
+# Shown when the search command gets no bytes or a bad one
+SEARCH_USAGE = "Invalid search command. Use 'search <byte1> <byte2> ...' (e.g., 'search A9 10 AA')."
+
+# Two-digit hex text of every byte, for the status line written on every traced instruction
+HEX_BYTE = tuple(f"{value:02X}" for value in range(256))
+
+# 'N V B D I Z C' text of every status register value, with '-' for clear flags
+FLAG_TEXT = tuple(' '.join(name if value & flag else '-' for name, flag in (
+    ('N', FLAG_N), ('V', FLAG_V), ('B', FLAG_B), ('D', FLAG_D),
+    ('I', FLAG_I), ('Z', FLAG_Z), ('C', FLAG_C))) for value in range(256))
+
+# Two's complement value of every byte, for relative branch offsets
+SIGNED_BYTE = tuple(value - 256 if value >= 128 else value for value in range(256))
+
+# Decimal mode ADC/SBC, one nibble at a time. The low nibble tables are indexed by
+# (a & 0x0F) << 5 | (value & 0x0F) << 1 | carry (borrow for SBC) and give the result
+# nibble, with bit 4 set when it carries (borrows) into the high nibble.
+# The high nibble tables take the same index built from the high nibbles and
+# that bit, and give the result in bits 4-7 with bit 8 holding the new carry flag.
+def _build_bcd_tables():
+    adc_low, adc_high, sbc_low, sbc_high = [], [], [], []
+    for index in range(512):
+        x = index >> 5
+        y = (index >> 1) & 0x0F
+        carry = index & 1
+
+        low = x + y + carry
+        if low > 9:
+            low += 6
+        adc_low.append((low & 0x0F) | (0x10 if low > 0x0F else 0))
+
+        high = x + y + carry
+        if high > 9:
+            high += 6
+        adc_high.append(((high & 0x0F) << 4) | (0x100 if high > 0x0F else 0))
+
+        low = x - y - carry
+        if low < 0:
+            low -= 6
+        sbc_low.append((low & 0x0F) | (0x10 if low < 0 else 0))
+
+        high = x - y - carry
+        if high < 0:
+            high -= 6
+        sbc_high.append(((high & 0x0F) << 4) | (0x100 if high >= 0 else 0))
+    return tuple(adc_low), tuple(adc_high), tuple(sbc_low), tuple(sbc_high)
+
+ADC_BCD_LOW, ADC_BCD_HIGH, SBC_BCD_LOW, SBC_BCD_HIGH = _build_bcd_tables()
+
+# Value updates for the read-modify-write instructions, used with CPU._rmw().
+# Each takes the CPU and the old value, updates the carry if needed,
+# and returns the new value.
+def _rmw_inc(cpu, value):
+    return (value + 1) & 0xFF
+
+def _rmw_dec(cpu, value):
+    return (value - 1) & 0xFF
+
+def _rmw_asl(cpu, value):
+    # Only sets the carry, it is never cleared here
+    if value & 0x80:
+        cpu.p |= FLAG_C
+    return (value << 1) & 0xFF
+
+def _rmw_lsr(cpu, value):
+    # Only sets the carry, it is never cleared here
+    if value & 0x01:
+        cpu.p |= FLAG_C
+    return value >> 1
+
+def _rmw_rol(cpu, value):
+    carry_in = cpu.p & FLAG_C
+    cpu.p = (cpu.p & ~FLAG_C) | (value >> 7)
+    return ((value << 1) | carry_in) & 0xFF
+
+def _rmw_ror(cpu, value):
+    carry_in = (cpu.p & FLAG_C) << 7
+    cpu.p = (cpu.p & ~FLAG_C) | (value & 0x01)
+    return (value >> 1) | carry_in
+
+def _rmw_slo(cpu, value):
+    # The ASL half of SLO, which also clears the carry
+    cpu.p = (cpu.p & ~FLAG_C) | (value >> 7)
+    return (value << 1) & 0xFF
 
 
 class CPU:
+    # Opcode tables, shared by every instance.
+    # commands, mnemonics and _itbl are built once, below the class body.
+    commands = None
+    mnemonics = None # Opcode to mnemonic, for the disassemblers
+    _itbl = None
+    cycles = CYCLE_COUNTS
+    increments = INSTRUCTION_INCREMENTS
+    # Debugger commands by name, also built below the class body
+    _debug_commands = None
 
     def __init__(self, bus: Bus):
         self.bus = bus
-        self.a = 0x00
-        self.x = 0x00
-        self.y = 0x00
-        self.pc = 0x1000
-        self.sp = 0xFF
-
-        self.irq_pending = False
-        self.nmi_pending = False
-        self.cycles_remaining = 0
-        self.breakpoints = set()
-        self.total_cycles = 0
+        self.a: int = 0x00
+        self.x: int = 0x00
+        self.y: int = 0x00
+        self.pc: int = 0x1000
+        self.sp: int = 0xFF
+
+        self.irq_pending: bool = False
+        self.nmi_pending: bool = False
+        self.cycles_remaining: int = 0
+        self.cia_cycles_pending: int = 0 # Cycles not yet clocked into the CIAs
+        self.breakpoints: set[int] = set()
+        # One byte per address, set where there is a breakpoint, so run_cycles()
+        # tests the PC with a single index. Kept in step with self.breakpoints.
+        self._breakpoint_map = bytearray(0x10000)
+        # The same addresses in ascending order, for listing without a sort.
+        self._sorted_bps: list[int] = []
+        # Address of a breakpoint to run past once after 'c', or -1.
+        # The breakpoint stays set and triggers again on the next visit.
+        self._skip_breakpoint: int = -1
+        self.total_cycles: int = 0
         self.tracing = False
         self.trace_file = None
+        self._trace_lines: list[str] = [] # Trace lines not yet written to trace_file
         self.auto_dasm_on_break = True
+        # True while an interrupt is pending, a breakpoint is set or tracing is on.
+        # tick() skips all of those checks when it is False.
+        self._has_events: bool = False
+
+
+        # Status register, packed as nvb1dizc (see the FLAG_* bits)
+        self.p: int = 0x00
+
+        # Address calculation for each addressing mode
+        self._addr_fn = [None] * Mode.COUNT
+        self._addr_fn[Mode.IMMEDIATE] = self._addr_immediate
+        self._addr_fn[Mode.ZEROPAGE] = self._addr_zeropage
+        self._addr_fn[Mode.ZEROPAGEX] = self._addr_zeropage_x
+        self._addr_fn[Mode.ZEROPAGEY] = self._addr_zeropage_y
+        self._addr_fn[Mode.ABSOLUTE] = self._addr_absolute
+        self._addr_fn[Mode.ABSOLUTEX] = self._addr_absolute_x
+        self._addr_fn[Mode.ABSOLUTEY] = self._addr_absolute_y
+        self._addr_fn[Mode.INDIRECT] = self._addr_indirect
+        self._addr_fn[Mode.RELATIVE] = self._addr_relative
+        self._addr_fn[Mode.INDIRECTX] = self._addr_indirect_x
+        self._addr_fn[Mode.INDIRECTY] = self._addr_indirect_y
+
+        # Operand value for each addressing mode, for instructions that only read memory.
+        # These fuse the address calculation and the memory read.
+        self._read_fn = [None] * Mode.COUNT
+        self._read_fn[Mode.IMMEDIATE] = self._operand8
+        self._read_fn[Mode.ZEROPAGE] = self._read_zeropage
+        self._read_fn[Mode.ZEROPAGEX] = self._read_zeropage_x
+        self._read_fn[Mode.ZEROPAGEY] = self._read_zeropage_y
+        self._read_fn[Mode.ABSOLUTE] = self._read_absolute
+        self._read_fn[Mode.ABSOLUTEX] = self._read_absolute_x
+        self._read_fn[Mode.ABSOLUTEY] = self._read_absolute_y
+        self._read_fn[Mode.INDIRECTX] = self._read_indirect_x
+        self._read_fn[Mode.INDIRECTY] = self._read_indirect_y
 
+    def tick(self):
+        """Runs the CPU for a single clock cycle."""
+        self.run_cycles(1)
+
+    def run_cycles(self, n: int) -> None:
+        """Runs the CPU for n clock cycles."""
+        # The whole loop runs in this one frame. Everything used on every cycle
+        # is bound to locals, and the cycle counters live in locals until the end.
+        bus = self.bus
+        ram = bus.ram
+        read = bus.read
+        memory = bus.memory
+        basic_rom = memory.basic_rom
+        kernal_rom = memory.kernal_rom
+        vic_tick = bus.vic.tick
+        badline_cycles = bus.vic.get_cycles_stolen()
+        cia1_tick = bus.cia1.tick
+        cia2_tick = bus.cia2.tick
+        itbl = self._itbl
+        breakpoint_map = self._breakpoint_map
+        cycles_remaining = self.cycles_remaining
+        cia_cycles = self.cia_cycles_pending
+
+        for _ in range(n):
+            # The VIC-II clock is synchronized with the CPU clock.
+            # It reports whether we are on a badline, which steals CPU cycles.
+            if vic_tick():
+                cycles_remaining -= badline_cycles
+
+            # Clock the CIA chips. Cycles are accumulated and the timers are
+            # advanced in one batch on the cycle where the next instruction executes,
+            # which is the only point where the CPU can observe them.
+            cia_cycles += 1
+            if cycles_remaining <= 0:
+                cia1_tick(cia_cycles)
+                cia2_tick(cia_cycles)
+                cia_cycles = 0
+
+            # Read once per cycle. Only the peripherals clocked above can raise it, and a
+            # stale True after an interrupt is handled just costs the checks below.
+            has_events = self._has_events
+            if has_events:
+                # Handle interrupts before doing anything else
+                if self.nmi_pending:
+                    self.handle_nmi()
+
+                if self.irq_pending and not self.p & FLAG_I:
+                    self.handle_irq()
+
+            # The PC is read once per cycle. Only the traps and the debugger below can change it.
+            pc = self.pc
+
+            # KERNAL LOAD and SAVE traps for HLE of disk drive ($FFD5 and $FFD8)
+            if 0xFFD5 <= pc <= 0xFFD8:
+                if pc == 0xFFD5:
+                    if self.handle_kernal_load():
+                        continue # Skip normal instruction execution
+                elif pc == 0xFFD8:
+                    if self.handle_kernal_save():
+                        continue # Skip normal instruction execution
+
+            # If we are at a breakpoint, enter the debugger
+            if has_events and breakpoint_map[pc & 0xFFFF]:
+                if pc != self._skip_breakpoint:
+                    self.cycles_remaining = cycles_remaining
+                    self.debug_prompt()
+                    cycles_remaining = self.cycles_remaining
+                    pc = self.pc
+                if cycles_remaining <= 0:
+                    # The instruction is fetched below, so the skip has been used up
+                    self._skip_breakpoint = -1
+
+            if cycles_remaining > 0:
+                cycles_remaining -= 1
+                continue # Wait for next tick
+
+            # --- Fetch and Execute New Instruction ---
+            # Fetch command, straight from the RAM buffer when the PC is in plain RAM.
+            # The KERNAL and BASIC ROMs hold most of the code run outside of RAM
+            # (the IRQ handler, the BASIC interpreter), so they skip the bus as well.
+            if RAM_ONLY_START <= pc < RAM_ONLY_END:
+                command = ram[pc]
+            else:
+                region = READ_MAP[memory.bank_config | (pc >> 8)]
+                if region == REGION_KERNAL:
+                    command = kernal_rom[pc - 0xE000]
+                elif region == REGION_BASIC:
+                    command = basic_rom[pc - 0xA000]
+                else:
+                    command = read(pc)
+
+            if has_events and self.tracing and self.trace_file:
+                trace_lines = self._trace_lines
+                trace_lines.append(f"{self.format_status()} | {self.disassemble(pc)}\n")
+                if len(trace_lines) >= TRACE_BATCH_LINES:
+                    self.trace_file.write(''.join(trace_lines))
+                    trace_lines.clear()
+
+            f, m, cycles, increment = itbl[command]
+            if f is not None:
+                # Handlers see the counter on self. Indexed addressing adds the
+                # page-crossing penalty to it and taken branches add theirs.
+                self.cycles_remaining = cycles
+
+                f(self, m)
+                cycles_remaining = self.cycles_remaining
+                self.pc += increment
+                self.total_cycles += cycles
+            else:
+                self.cycles_remaining = cycles_remaining
+                print(f"ERROR: Opcode {command:02X} not implemented at location ${self.pc:04X}")
+                self.debug_prompt()
+                cycles_remaining = self.cycles_remaining
+
+        self.cycles_remaining = cycles_remaining
+        self.cia_cycles_pending = cia_cycles
+
+    # --- Addressing modes ---
+    # One small method per mode, looked up through self._addr_fn.
+    def _addr_immediate(self):
+        return self.pc + 1
+
+    def _operand16(self):
+        """Returns the little-endian 16-bit operand that follows the opcode."""
+        pc = self.pc
+        # Operands in plain RAM are read straight from the RAM buffer
+        if RAM_ONLY_START <= pc < RAM_ONLY_END - 2:
+            ram = self.bus.ram
+            return ram[pc + 1] | (ram[pc + 2] << 8)
+        # Operands in a banked-in ROM come from its pre-decoded words
+        memory = self.bus.memory
+        region = READ_MAP[memory.bank_config | (pc >> 8)]
+        if region == REGION_KERNAL and pc < 0xFFFE:
+            return memory.kernal_words[pc - 0xDFFF]
+        if region == REGION_BASIC and pc < 0xBFFE:
+            return memory.basic_words[pc - 0x9FFF]
+        read = self.bus.read
+        return read(pc + 1) | (read(pc + 2) << 8)
+
+    def _operand8(self):
+        """Returns the byte operand that follows the opcode."""
+        pc = self.pc
+        if RAM_ONLY_START <= pc < RAM_ONLY_END - 1:
+            return self.bus.ram[pc + 1]
+        memory = self.bus.memory
+        region = READ_MAP[memory.bank_config | (pc >> 8)]
+        if region == REGION_KERNAL and pc < 0xFFFF:
+            return memory.kernal_rom[pc - 0xDFFF]
+        if region == REGION_BASIC and pc < 0xBFFF:
+            return memory.basic_rom[pc - 0x9FFF]
+        return self.bus.read(pc + 1)
+
+    def _addr_absolute(self):
+        return self._operand16()
+
+    # The indexed modes below take an extra cycle when indexing crosses a page.
+    # They charge it here, while the base address is at hand.
+    def _addr_absolute_x(self):
+        base = self._operand16()
+        loc = base + self.x
+        if (base ^ loc) & 0xFF00:
+            self.cycles_remaining += 1
+            self.total_cycles += 1
+        return loc
 
-        self.n = False   # N - Negative flag
-        self.v = False   # V - Overflow
-        self.b = False   # B - Break
-        self.d = False   # D - Decimal  
-        self.i = False   # I - Interrupt
-        self.z = False   # Z - Zero
-        self.c = False   # C - Carry
-        
-        self.commands = get_opcode_definitions(self)
-        self.cycles = CYCLE_COUNTS
-        self.increments = INSTRUCTION_INCREMENTS
+    def _addr_absolute_y(self):
+        base = self._operand16()
+        loc = base + self.y
+        if (base ^ loc) & 0xFF00:
+            self.cycles_remaining += 1
+            self.total_cycles += 1
+        return loc
 
-    def tick(self):
-        # The VIC-II clock is synchronized with the CPU clock
-        self.bus.vic.tick()
-        
-        # Check for badlines and adjust cycle count
-        if self.bus.vic.is_badline():
-            stolen_cycles = self.bus.vic.get_cycles_stolen()
-            self.cycles_remaining -= stolen_cycles
+    def _addr_zeropage(self):
+        return self._operand8()
 
+    def _addr_zeropage_x(self):
+        return self._operand8() + self.x
 
-        # Clock the CIA chips
-        self.bus.cia1.tick()
-        self.bus.cia2.tick()
+    def _addr_zeropage_y(self):
+        return self._operand8() + self.y
 
-        # Handle interrupts before doing anything else
-        if self.nmi_pending:
-            self.handle_nmi()
-        
-        if self.irq_pending and not self.i:
-            self.handle_irq()
+    def _addr_indirect(self):
+        # Get memory location where the JMP address is
+        loc = self._operand16()
 
-        # KERNAL LOAD trap for HLE of disk drive
-        if self.pc == 0xFFD5:
-            if self.handle_kernal_load():
-                return # Skip normal instruction execution
-        
-        # KERNAL SAVE trap for HLE of disk drive
-        if self.pc == 0xFFD8:
-            if self.handle_kernal_save():
-                return # Skip normal instruction execution
-
-        command = self.bus.read(self.pc)
-
-        # If we are at a breakpoint, enter the debugger
-        if self.pc in self.breakpoints:
-            self.debug_prompt()
-
-        if self.cycles_remaining > 0:
-            self.cycles_remaining -= 1
-            return # Wait for next tick
-
-        # --- Fetch and Execute New Instruction ---
-        # Fetch command
-        command = self.bus.read(self.pc)
-
-        if self.tracing and self.trace_file:
-            status = f"A:{self.a:02X} X:{self.x:02X} Y:{self.y:02X} PC:{self.pc:04X} SP:{self.sp:02X}"
-            flags = f"  Flags: {'N' if self.n else '-'} {'V' if self.v else '-'} {'B' if self.b else '-'} {'D' if self.d else '-'} {'I' if self.i else '-'} {'Z' if self.z else '-'} {'C' if self.c else '-'}"
-            disassembly = self.disassemble(self.pc)
-            self.trace_file.write(f"{status}{flags} | {disassembly}\n")
-
-        if command in self.commands:
-            f = self.commands[command]["f"]
-            m = self.commands[command]["m"]
-            
-            cycles = self.cycles.get(command, 2)
-            
-            if m in [Mode.ABSOLUTEX, Mode.ABSOLUTEY, Mode.INDIRECTY] and self.page_boundary_crossed(m):
-                cycles += 1
-            
-            self.cycles_remaining = cycles
-            
-            f(m)
-            self.pc += self.increments.get(m, 1)
-            self.total_cycles += cycles
-        else:
-            print(f"ERROR: Opcode {command:02X} not implemented at location ${self.pc:04X}")
-            self.debug_prompt()
-
-
-    def get_location_by_mode(self,mode):
-        if mode == Mode.IMMEDIATE:
-            loc = self.pc + 1
-
-        elif mode == Mode.ABSOLUTE:
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            loc = msb * 256 + lsb
-
-        elif mode == Mode.ABSOLUTEX:
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            loc = msb * 256 + lsb
-            loc += self.x
-
-        elif mode == Mode.ABSOLUTEY:
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            loc = msb * 256 + lsb
-            loc += self.y
-        elif mode == Mode.ZEROPAGE:
-            lsb = self.bus.read(self.pc + 1)
-
-            loc = lsb
-
-        elif mode == Mode.ZEROPAGEX:
-            lsb = self.bus.read(self.pc + 1)
-            loc = lsb + self.x
-        
-        elif mode == Mode.ZEROPAGEY:
-            lsb = self.bus.read(self.pc + 1)
-            loc = lsb + self.y
+        # Get the JMP address from memory location
+        lsb = self.bus.read(loc)
+        msb = self.bus.read(loc + 1)
+        return (msb << 8) | lsb
 
-        
-        elif mode == Mode.INDIRECT:
-            # Get memory location where the JMP address os
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            loc = msb * 256 + lsb
-
-            # Get the JMP address from memory location
-            lsb = self.bus.read(loc)
-            msb = self.bus.read(loc + 1)
-            loc = msb * 256 + lsb
-        
-        elif mode == Mode.RELATIVE:
-            loc = self.pc +1 
-        
-        elif mode == Mode.INDIRECTX:
-            addr = self.bus.read(self.pc + 1)
-            addr = (addr + self.x) & 0xFF
-            lsb = self.bus.read(addr)
-            msb = self.bus.read((addr + 1) & 0xFF)
-            loc = (msb << 8) | lsb
-
-        elif mode == Mode.INDIRECTY:
-            addr = self.bus.read(self.pc + 1)
-            lsb = self.bus.read(addr)
-            msb = self.bus.read((addr + 1) & 0xFF)
-            base_loc = (msb << 8) | lsb
-            loc = base_loc + self.y
+    def _addr_relative(self):
+        return self.pc + 1
 
+    def _zeropage_pointer(self, addr):
+        """Returns the 16-bit pointer stored at zero page address addr, wrapping within the page."""
+        # Both bytes are plain RAM unless the pointer touches the processor port at $0000/$0001
+        if 0x01 < addr < 0xFF:
+            ram = self.bus.ram
+            return ram[addr] | (ram[addr + 1] << 8)
+        read = self.bus.read
+        return read(addr) | (read((addr + 1) & 0xFF) << 8)
+
+    def _addr_indirect_x(self):
+        return self._zeropage_pointer((self._operand8() + self.x) & 0xFF)
+
+    def _addr_indirect_y(self):
+        base = self._zeropage_pointer(self._operand8())
+        loc = base + self.y
+        if (base ^ loc) & 0xFF00:
+            self.cycles_remaining += 1
+            self.total_cycles += 1
         return loc
 
-    def page_boundary_crossed(self, mode):
-        if mode == Mode.ABSOLUTEX:
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            address = (msb << 8) | lsb
-            return (address & 0xFF00) != ((address + self.x) & 0xFF00)
-        elif mode == Mode.ABSOLUTEY:
-            lsb = self.bus.read(self.pc + 1)
-            msb = self.bus.read(self.pc + 2)
-            address = (msb << 8) | lsb
-            return (address & 0xFF00) != ((address + self.y) & 0xFF00)
-        elif mode == Mode.INDIRECTY:
-            addr = self.bus.read(self.pc + 1)
-            lsb = self.bus.read(addr)
-            msb = self.bus.read((addr + 1) & 0xFF)
-            base_loc = (msb << 8) | lsb
-            return (base_loc & 0xFF00) != ((base_loc + self.y) & 0xFF00)
-        return False
-    
+    # --- Operand reads ---
+    # Plain RAM is read straight from the RAM buffer, anything else goes through the bus.
+    # The zero page is RAM apart from the processor port at $0000/$0001.
+    def _read_zeropage(self):
+        loc = self._operand8()
+        if loc > 0x01:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_zeropage_x(self):
+        loc = self._operand8() + self.x
+        if loc > 0x01:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_zeropage_y(self):
+        loc = self._operand8() + self.y
+        if loc > 0x01:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_absolute(self):
+        loc = self._operand16()
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_absolute_x(self):
+        loc = self._addr_absolute_x()
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_absolute_y(self):
+        loc = self._addr_absolute_y()
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_indirect_x(self):
+        loc = self._addr_indirect_x()
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
+    def _read_indirect_y(self):
+        loc = self._addr_indirect_y()
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            return self.bus.ram[loc]
+        return self.bus.read(loc)
+
     def irq(self):
         self.irq_pending = True
+        self._has_events = True
 
     def nmi(self):
         self.nmi_pending = True
+        self._has_events = True
+
+    def _update_events(self):
+        """Recomputes the flag that makes tick() look at interrupts, breakpoints and tracing."""
+        self._has_events = self.irq_pending or self.nmi_pending or self.tracing or bool(self.breakpoints)
+
+    def add_breakpoint(self, address):
+        """Sets a breakpoint that enters the debugger when the PC reaches address."""
+        if address not in self.breakpoints:
+            self.breakpoints.add(address)
+            bisect.insort(self._sorted_bps, address)
+        if 0 <= address <= 0xFFFF:
+            self._breakpoint_map[address] = 1
+        self._has_events = True
+
+    def remove_breakpoint(self, address):
+        """Removes the breakpoint at address, if there is one."""
+        if address in self.breakpoints:
+            self.breakpoints.remove(address)
+            del self._sorted_bps[bisect.bisect_left(self._sorted_bps, address)]
+        if 0 <= address <= 0xFFFF:
+            self._breakpoint_map[address] = 0
+
+    def clear_breakpoints(self):
+        """Removes all breakpoints."""
+        self.breakpoints.clear()
+        self._sorted_bps.clear()
+        self._breakpoint_map[:] = bytes(0x10000)
 
     def handle_irq(self):
-        # Push PC to stack
-        self.bus.write(0x0100 + self.sp, (self.pc >> 8) & 0xFF)
-        self.sp -= 1
-        self.bus.write(0x0100 + self.sp, self.pc & 0xFF)
-        self.sp -= 1
+        # Push PC to stack, wrapping the stack pointer within page 1
+        ram = self.bus.ram
+        sp = self.sp
+        ram[0x0100 + sp] = (self.pc >> 8) & 0xFF
+        sp = (sp - 1) & 0xFF
+        ram[0x0100 + sp] = self.pc & 0xFF
+        self.sp = (sp - 1) & 0xFF
+        self.bus.dirty_pages[0x01] = 1
 
         # Push status register to stack, with B flag cleared
-        self.b = False
+        self.p &= ~FLAG_B
         self.PHP(Mode.IMPLIED)
 
         # Set interrupt disable flag
-        self.i = True
+        self.p |= FLAG_I
 
         # Load PC from IRQ vector
         lsb = self.bus.read(0xFFFE)
@@ -218,20 +557,24 @@ class CPU:
         self.pc = (msb << 8) | lsb
         
         self.irq_pending = False
+        self._update_events()
 
     def handle_nmi(self):
-        # Push PC to stack
-        self.bus.write(0x0100 + self.sp, (self.pc >> 8) & 0xFF)
-        self.sp -= 1
-        self.bus.write(0x0100 + self.sp, self.pc & 0xFF)
-        self.sp -= 1
+        # Push PC to stack, wrapping the stack pointer within page 1
+        ram = self.bus.ram
+        sp = self.sp
+        ram[0x0100 + sp] = (self.pc >> 8) & 0xFF
+        sp = (sp - 1) & 0xFF
+        ram[0x0100 + sp] = self.pc & 0xFF
+        self.sp = (sp - 1) & 0xFF
+        self.bus.dirty_pages[0x01] = 1
 
         # Push status register to stack, with B flag cleared
-        self.b = False
+        self.p &= ~FLAG_B
         self.PHP(Mode.IMPLIED)
 
         # Set interrupt disable flag
-        self.i = True
+        self.p |= FLAG_I
 
         # Load PC from NMI vector
         lsb = self.bus.read(0xFFFA)
@@ -239,6 +582,7 @@ class CPU:
         self.pc = (msb << 8) | lsb
 
         self.nmi_pending = False
+        self._update_events()
 
     def BRK(self, mode):
         # Before handling the break, check if it's a KERNAL call we want to trap
@@ -251,149 +595,140 @@ class CPU:
                 return
 
         self.pc += 1
-        self.i = True
+        self.p |= FLAG_I
         self.handle_irq() # BRK uses the IRQ handler logic
-        self.b = True
+        self.p |= FLAG_B
 
     def RTI(self, mode):
         self.PLP(mode)
         self.RTS(mode)
-    # wrap 8 bit  value
-    def wrap(self,value):
-        if value > 255:
-            value = value % 256
-        elif value < 0:
-            value += 256
-        return value
 
-    def set_nz(self, value):
-        self.z = (value == 0)
-        self.n = bool(value & 0x80)
+    def _rmw(self, mode, op):
+        """
+        Read-modify-write on memory: one address lookup, one read and one write,
+        then N and Z from the new value. Returns the new value.
+        """
+        loc = self._addr_fn[mode]()
+        bus = self.bus
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            value = bus.ram[loc] = op(self, bus.ram[loc])
+            bus.dirty_pages[loc >> 8] = 1
+        else:
+            value = op(self, bus.read(loc))
+            bus.write(loc, value)
+        self.p = (self.p & 0x7D) | NZ_TABLE[value]
+        return value
 
     def BIT(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
         result = self.a & value
 
-        self.z = (result == 0)
-        self.n = bool(value & 0x80)
-        self.v = bool(value & 0x40)
+        # N and V come straight from bits 7 and 6 of the operand
+        self.p = (self.p & 0x3D) | (value & 0xC0) | (FLAG_Z if result == 0 else 0)
 
     # LDA
     def LDA(self,mode):
         # Find the location based on the mode
-        loc = self.get_location_by_mode(mode)
-        # Load value from memory
-        val = self.bus.read(loc)
+        val = self._read_fn[mode]()
         # Put that value in the accumulator
         self.a = val
 
         # Set nz
-        self.set_nz(self.a)
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
 
 
     # LDX
     def LDX(self,mode):
-        loc = self.get_location_by_mode(mode)
-        # Load value from memory
-        val = self.bus.read(loc)
+        val = self._read_fn[mode]()
         # Put that value in the accumulator
         self.x = val
 
         # Set nz
-        self.set_nz(self.x)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.x]
 
 
     # LDY
     def LDY(self,mode):
-        loc = self.get_location_by_mode(mode)
-        # Load value from memory
-        val = self.bus.read(loc)
+        val = self._read_fn[mode]()
         # Put that value in the accumulator
         self.y = val
 
         # Set nz
-        self.set_nz(self.y)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.y]
 
     
     # STA - Absolute
     def STA(self,mode):
         # Find the location based on the mode
-        loc = self.get_location_by_mode(mode)
-        # Update memory
-        self.bus.write(loc, self.a)
+        loc = self._addr_fn[mode]()
+        # Update memory, straight into the RAM buffer when the location is plain RAM
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            self.bus.ram[loc] = self.a
+            self.bus.dirty_pages[loc >> 8] = 1
+        else:
+            self.bus.write(loc, self.a)
 
     # STX - Absolute
     def STX(self,mode):
         # Find the location based on the mode
-        loc = self.get_location_by_mode(mode)
-        # Update memory
-        self.bus.write(loc, self.x)
+        loc = self._addr_fn[mode]()
+        # Update memory, straight into the RAM buffer when the location is plain RAM
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            self.bus.ram[loc] = self.x
+            self.bus.dirty_pages[loc >> 8] = 1
+        else:
+            self.bus.write(loc, self.x)
 
     # STY - Absolute
     def STY(self,mode):
         # Find the location based on the mode
-        loc = self.get_location_by_mode(mode)
-        # Update memory
-        self.bus.write(loc, self.y)
+        loc = self._addr_fn[mode]()
+        # Update memory, straight into the RAM buffer when the location is plain RAM
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            self.bus.ram[loc] = self.y
+            self.bus.dirty_pages[loc >> 8] = 1
+        else:
+            self.bus.write(loc, self.y)
     
     def INC(self,mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
-        
-        value += 1
-        value = self.wrap(value)        
-        self.bus.write(loc, value)
-        # Set nz
-        self.set_nz(value)        
+        self._rmw(mode, _rmw_inc)
 
     # Undocumented Opcodes
     # SLO (ASL + ORA)
     def SLO(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
-        self.c = bool(value & 0x80)
-        value = (value << 1) & 0xFF
-        self.bus.write(loc, value)
-        self.a |= value
-        self.set_nz(self.a)
+        self.a |= self._rmw(mode, _rmw_slo)
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
     # RLA (ROL + AND)
     def RLA(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
-        carry_in = 1 if self.c else 0
-        self.c = bool(value & 0x80)
-        value = ((value << 1) | carry_in) & 0xFF
-        self.bus.write(loc, value)
-        self.a &= value
-        self.set_nz(self.a)
+        self.a &= self._rmw(mode, _rmw_rol)
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
     # SAX (Store A & X)
     def SAX(self, mode):
-        loc = self.get_location_by_mode(mode)
+        loc = self._addr_fn[mode]()
         value = self.a & self.x
-        self.bus.write(loc, value)
+        if RAM_ONLY_START <= loc < RAM_ONLY_END:
+            self.bus.ram[loc] = value
+            self.bus.dirty_pages[loc >> 8] = 1
+        else:
+            self.bus.write(loc, value)
 
     # LAX (LDA + LDX)
     def LAX(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
         self.a = value
         self.x = value
-        self.set_nz(value)
+        self.p = (self.p & 0x7D) | NZ_TABLE[value]
 
     # DCP (DEC + CMP)
     def DCP(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
-        value = (value - 1) & 0xFF
-        self.bus.write(loc, value)
+        value = self._rmw(mode, _rmw_dec)
         result = self.a - value
-        self.c = (self.a >= value)
-        self.set_nz(result)
+        self.p = (self.p & ~FLAG_C) | (FLAG_C if self.a >= value else 0)
+        self.p = (self.p & 0x7D) | NZ_TABLE[result]
 
 
 
@@ -402,107 +737,94 @@ class CPU:
 
 
     def INX(self,mode):
-        self.x += 1
-        self.x = self.wrap(self.x)
+        self.x = (self.x + 1) & 0xFF
         # Set nz
-        self.set_nz(self.x)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.x]
 
 
     def INY(self,mode):
-        self.y += 1
-        self.y = self.wrap(self.y)
+        self.y = (self.y + 1) & 0xFF
         # Set nz
-        self.set_nz(self.y)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.y]
 
 
     def DEC(self,mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
-        
-        value -= 1
-        value = self.wrap(value)        
-        self.bus.write(loc, value)
-        # Set nz
-        self.set_nz(value)
+        self._rmw(mode, _rmw_dec)
 
     def DEX(self,mode):
-        self.x -= 1
-        self.x = self.wrap(self.x)
+        self.x = (self.x - 1) & 0xFF
         # Set nz
-        self.set_nz(self.x)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.x]
 
 
     def DEY(self,mode):
-        self.y -= 1
-        self.y = self.wrap(self.y)
+        self.y = (self.y - 1) & 0xFF
         # Set nz
-        self.set_nz(self.y)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.y]
 
 
     def TAX(self,mode):
         self.x = self.a
         # Set nz
-        self.set_nz(self.a)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
     def TXA(self,mode):
         self.a = self.x
         # Set nz
-        self.set_nz(self.a)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
     def TAY(self,mode):
         self.y = self.a
         # Set nz
-        self.set_nz(self.y)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.y]
 
 
     def TYA(self,mode):
         self.a = self.y
         # Set nz
-        self.set_nz(self.a)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
     def CLC(self,mode):
-        self.c = False
+        self.p &= ~FLAG_C
 
     def SEC(self,mode):
-        self.c = True
+        self.p |= FLAG_C
     
     def CLI(self,mode):
-        self.i = False
+        self.p &= ~FLAG_I
 
     def SEI(self,mode):
-        self.i = True
+        self.p |= FLAG_I
 
     def CLV(self,mode):
-        self.v = False
+        self.p &= ~FLAG_V
 
     def CLD(self,mode):
-        self.d = False
+        self.p &= ~FLAG_D
 
     def SED(self,mode):
-        self.d = True
+        self.p |= FLAG_D
 
     def JMP(self,mode):
-        loc = self.get_location_by_mode(mode)
+        loc = self._addr_fn[mode]()
         self.pc = loc - self.increments[mode]
 
     def CMP(self,mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
 
         result = self.a - value
-        self.c = (self.a >= value)
-        self.set_nz(result)
+        self.p = (self.p & ~FLAG_C) | (FLAG_C if self.a >= value else 0)
+        self.p = (self.p & 0x7D) | NZ_TABLE[result]
 
     def _compare(self, mode, register_value):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
         result = register_value - value
 
-        self.c = (register_value >= value)
-        self.set_nz(result)
+        self.p = (self.p & ~FLAG_C) | (FLAG_C if register_value >= value else 0)
+        self.p = (self.p & 0x7D) | NZ_TABLE[result]
 
     # CPX
     def CPX(self, mode):
@@ -514,57 +836,50 @@ class CPU:
 
     def _branch(self, condition):
         if condition:
-            # Branch is taken, add one cycle
-            self.cycles_remaining += 1
-
-            loc = self.get_location_by_mode(Mode.RELATIVE)
-            value = self.bus.read(loc)
-
-            # Recalculate if negative
-            if value >= 128:
-                value -= 256
-
-            # The new PC will be the current PC + the relative offset.
-            # The current PC has already been incremented by 2 in the tick method.
-            new_pc = self.pc + value
+            pc = self.pc
 
-            # If the page changes, add another cycle
-            if (self.pc & 0xFF00) != (new_pc & 0xFF00):
-                self.cycles_remaining += 1
+            # The new PC will be the current PC + the relative offset, a signed byte.
+            # The PC still points at the branch opcode, the dispatcher adds the
+            # instruction length of 2 after this handler returns.
+            new_pc = pc + SIGNED_BYTE[self._operand8()]
 
-            self.pc += value
+            # Branch is taken, add one cycle, and another one if the page changes.
+            # The offset moves at most one page, so the page changed exactly when
+            # bit 8 of the two addresses differs.
+            self.cycles_remaining += 1 + (((pc ^ new_pc) >> 8) & 1)
+            self.pc = new_pc
 
     # BMI
     def BMI(self, mode):
-        self._branch(self.n)
+        self._branch(self.p & FLAG_N)
 
     # BPL
     def BPL(self, mode):
-        self._branch(not self.n)
+        self._branch(not self.p & FLAG_N)
     
     # BVC
     def BVC(self, mode):
-        self._branch(self.v)
+        self._branch(self.p & FLAG_V)
     
     # BVS
     def BVS(self, mode):
-        self._branch(not self.v)
+        self._branch(not self.p & FLAG_V)
 
     # BCC
     def BCC(self, mode):
-        self._branch(not self.c)
+        self._branch(not self.p & FLAG_C)
 
     # BCS
     def BCS(self, mode):
-        self._branch(self.c)
+        self._branch(self.p & FLAG_C)
 
     # BNE
     def BNE(self, mode):
-        self._branch(not self.z)
+        self._branch(not self.p & FLAG_Z)
 
     # BEQ
     def BEQ(self, mode):
-        self._branch(self.z)
+        self._branch(self.p & FLAG_Z)
 
     # TXS
     def TXS(self, mode):
@@ -574,117 +889,62 @@ class CPU:
     def TSX(self, mode):
         self.x = self.sp
         # Set nz
-        self.set_nz(self.x)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.x]
 
 
+    # The stack page is plain RAM, so the stack instructions access the RAM buffer directly.
+
     # PHA
     def PHA(self, mode):
         # Find the location
         loc = 0x0100 + self.sp
         # Copy to the accumulator
-        self.bus.write(loc, self.a)
+        self.bus.ram[loc] = self.a
+        self.bus.dirty_pages[0x01] = 1
         # Decrement the stack pointer
-        self.sp -= 1
-        # wrap
-        self.sp = self.wrap(self.sp)
+        self.sp = (self.sp - 1) & 0xFF
 
 
     # PLA
     def PLA(self, mode):
-        self.sp += 1
-
-        # Wrap
-        self.sp = self.wrap(self.sp)
+        # Increment the stack pointer, wrapping within page 1
+        self.sp = (self.sp + 1) & 0xFF
 
         #Find the location
         loc = 0x100 + self.sp
 
         # Copy the value to accumulator
-        self.a = self.bus.read(loc)
+        self.a = self.bus.ram[loc]
         # Set nz
-        self.set_nz(self.a)
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
 
     # PHP
     def PHP(self, mode):
         # nvb1dizc
-        val = 0
-        if self.n == True:
-            val += 128
-        if self.v == True:
-            val += 64
-        if self.b == True:
-            val += 32
-        val += 16
-        if self.d == True:
-            val += 8
-        if self.i == True:
-            val += 4
-        if self.z == True:
-            val += 2
-        if self.c == True:
-            val += 1
+        val = self.p | 0x10
 
         # Find the location
         loc = 0x0100 + self.sp
 
         # Copy to the accumulator
-        self.bus.write(loc, val)
+        self.bus.ram[loc] = val
+        self.bus.dirty_pages[0x01] = 1
         # Decrement the stack pointer
-        self.sp -= 1
-        # wrap
-        self.sp = self.wrap(self.sp)
+        self.sp = (self.sp - 1) & 0xFF
 
     # PLP
     def PLP(self, mode):
-        self.sp += 1
-
-        # Wrap
-        self.sp = self.wrap(self.sp)
+        # Increment the stack pointer, wrapping within page 1
+        self.sp = (self.sp + 1) & 0xFF
 
         #Find the location
         loc = 0x100 + self.sp
 
-        # Copy the value to accumulator
-        val = self.bus.read(loc)
-
-        # Decode value and update flags
-        if val & 128 == 128:
-            self.n = True
-        else:
-            self.n = False
-
-        if val & 64 == 64:
-            self.v = True
-        else:
-            self.v = False
-
-        if val & 32 == 32:
-            self.b = True
-        else:
-            self.b = False
-
-        
-        if val & 8 == 8:
-            self.d = True
-        else:
-            self.d = False
-
-        if val & 4 == 4:
-            self.i = True
-        else:
-            self.i = False
-        
-        if val & 2 == 2:
-            self.z = True
-        else:
-            self.z = False
-
-        if val & 1 == 1:
-            self.c = True
-        else:
-            self.c = False
+        # Bit 4 is not a flag, it only exists on the stack.
+        # All other bits are restored as they were pushed, in one masked store.
+        self.p = self.bus.ram[loc] & 0xEF
 
 
     # JSR
@@ -692,18 +952,18 @@ class CPU:
         # Return location (-1)
         loc = self.pc + 2
         
-        # Push high byte of return address
-        self.bus.write(0x0100 + self.sp, (loc >> 8) & 0xFF)
-        self.sp -= 1
-        self.sp = self.wrap(self.sp)
-
-        # Push low byte of return address
-        self.bus.write(0x0100 + self.sp, loc & 0xFF)
-        self.sp -= 1
-        self.sp = self.wrap(self.sp)
+        # Push the return address, high byte first.
+        # The stack page is plain RAM, so it is written directly.
+        ram = self.bus.ram
+        sp = self.sp
+        ram[0x0100 + sp] = (loc >> 8) & 0xFF
+        sp = (sp - 1) & 0xFF
+        ram[0x0100 + sp] = loc & 0xFF
+        self.sp = (sp - 1) & 0xFF
+        self.bus.dirty_pages[0x01] = 1
         
         # Change program counter to new location
-        loc = self.get_location_by_mode(mode)
+        loc = self._addr_fn[mode]()
         self.pc = loc - self.increments[mode]
 
 
@@ -711,141 +971,111 @@ class CPU:
 
     # RTS
     def RTS(self, mode):
-        # Copy A value to temp
-        temp_a = self.a
-        # Pull the lsb
-        self.PLA(mode)
-        lsb = self.a
-        # Pull the msb
-        self.PLA(mode)  
-        msb = self.a
-
-
-        # Restore temp to A
-        self.a = temp_a
+        # Pull the return address, low byte first.
+        # Unlike PLA this leaves A and the flags alone.
+        ram = self.bus.ram
+        sp = (self.sp + 1) & 0xFF
+        lsb = ram[0x0100 + sp]
+        sp = (sp + 1) & 0xFF
+        msb = ram[0x0100 + sp]
+        self.sp = sp
 
         # Set PC to return address
-        loc = msb * 256 + lsb
-        self.pc = loc
+        self.pc = (msb << 8) | lsb
 
     
     # ADC
     def ADC(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
+
+        if self.p & FLAG_D:
+            # Decimal mode, one table lookup per nibble (see ADC_BCD_LOW)
+            a = self.a
+            low = ADC_BCD_LOW[((a & 0x0F) << 5) | ((value & 0x0F) << 1) | (self.p & FLAG_C)]
+            high = ADC_BCD_HIGH[((a >> 4) << 5) | ((value >> 4) << 1) | (low >> 4)]
 
-        if self.d:
-            # Decimal mode
-            carry = 1 if self.c else 0
-            
-            # Add lower nibbles
-            low = (self.a & 0x0F) + (value & 0x0F) + carry
-            if low > 9:
-                low += 6
-
-            # Add upper nibbles
-            high = (self.a >> 4) + (value >> 4)
-            if low > 0x0F:
-                high += 1
-            
             # N and V flags are not valid in decimal mode on NMOS 6502
             # We can leave them as they are or update based on binary result before correction
 
-            if high > 9:
-                high += 6
-
-            self.c = high > 0x0F
-            self.a = ((high & 0x0F) << 4) | (low & 0x0F)
-            self.set_nz(self.a)
+            self.p = (self.p & ~FLAG_C) | (high >> 8)
+            self.a = (high & 0xF0) | (low & 0x0F)
+            self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
         else:
             # Binary mode
+            a = self.a
+            p = self.p
             # Add value to the accumulator
-            result = self.a + value + (1 if self.c else 0)
+            result = a + value + (p & FLAG_C)
 
-            # Set V flag
-            self.v = bool((~(self.a ^ value) & (self.a ^ result)) & 0x80)
+            # Set V flag, and carry and wrap around
+            overflow = FLAG_V if (~(a ^ value) & (a ^ result)) & 0x80 else 0
+            a = result & 0xFF
+            self.a = a
 
-            # Carry and wrap around
-            self.c = result > 0xFF
-            self.a = self.wrap(result)
-            
-            # Set nz
-            self.set_nz(self.a)
+            # Set C, V, N and Z in one store (0x3C keeps I, D, B and bit 4)
+            self.p = (p & 0x3C) | overflow | (FLAG_C if result > 0xFF else 0) | NZ_TABLE[a]
 
 
     # SBC
     def SBC(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
         
-        if self.d:
-            # Decimal mode
-            borrow = 0 if self.c else 1
-            
-            # Subtract lower nibbles
-            low = (self.a & 0x0F) - (value & 0x0F) - borrow
-            if low < 0:
-                low -= 6
-
-            # Subtract upper nibbles
-            high = (self.a >> 4) - (value >> 4)
-            if low < 0:
-                high -= 1
-            
-            if high < 0:
-                high -= 6
-
-            self.c = high >= 0
-            self.a = ((high & 0x0F) << 4) | (low & 0x0F)
-            self.set_nz(self.a)
+        if self.p & FLAG_D:
+            # Decimal mode, one table lookup per nibble (see SBC_BCD_LOW)
+            a = self.a
+            low = SBC_BCD_LOW[((a & 0x0F) << 5) | ((value & 0x0F) << 1) | ((self.p & FLAG_C) ^ 1)]
+            high = SBC_BCD_HIGH[((a >> 4) << 5) | ((value >> 4) << 1) | (low >> 4)]
+
+            self.p = (self.p & ~FLAG_C) | (high >> 8)
+            self.a = (high & 0xF0) | (low & 0x0F)
+            self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
         else:
             # Binary mode
-            result = self.a - value - (0 if self.c else 1)
+            a = self.a
+            p = self.p
+            result = a - value - ((p & FLAG_C) ^ 1)
 
-            # Set V flag
-            self.v = bool(((self.a ^ value) & (self.a ^ result)) & 0x80)
+            # Set V flag and carry
+            overflow = FLAG_V if ((a ^ value) & (a ^ result)) & 0x80 else 0
+            a = result & 0xFF
+            self.a = a
 
-            self.c = result >= 0
-            self.a = self.wrap(result)
-            
-            self.set_nz(self.a)
+            # Set C, V, N and Z in one store (0x3C keeps I, D, B and bit 4)
+            self.p = (p & 0x3C) | overflow | (FLAG_C if result >= 0 else 0) | NZ_TABLE[a]
 
 
 
     # AND
     def AND(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
 
         # Perform logical AND
         self.a = self.a & value
 
         # Set nz
-        self.set_nz(self.a)
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
     # ORA
     def ORA(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
 
         # Perform logical ORA
         self.a = self.a | value
 
         # Set nz
-        self.set_nz(self.a)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
     # EOR
     def EOR(self, mode):
-        loc = self.get_location_by_mode(mode)
-        value = self.bus.read(loc)
+        value = self._read_fn[mode]()
 
         # Perform logical EOR
         self.a = self.a ^ value
         
         # Set nz
-        self.set_nz(self.a)        
+        self.p = (self.p & 0x7D) | NZ_TABLE[self.a]
 
 
     # NOP
@@ -855,133 +1085,62 @@ class CPU:
     # ASL
     def ASL(self, mode):
         if mode == Mode.ACCUMULATOR:
-            value = self.a
-        else:
-            loc = self.get_location_by_mode(mode)
-            value = self.bus.read(loc)
-        
-        # Check the leftmost bit
-        if value & 128 == 128:
-            self.c = True
-        
-        # Shift Left
-        value = value << 1  # shift 1 bit to left
-        value = self.wrap(value)
-
-
-        # Put the value into the accumulator or memory
-        if mode == Mode.ACCUMULATOR:
-            self.a = value
+            self._asl_accumulator(mode)
         else:
-            self.bus.write(loc, value)
-        
-        # Set nz
-        self.set_nz(value)
-
+            self._rmw(mode, _rmw_asl)
 
     # LSR
     def LSR(self, mode):
         if mode == Mode.ACCUMULATOR:
-            value = self.a
+            self._lsr_accumulator(mode)
         else:
-            loc = self.get_location_by_mode(mode)
-            value = self.bus.read(loc)
-        
-        # Check the rightmost bit
-        if value & 1 == 1:
-            self.c = True
-        
-        # Shift Right
-        value = value >> 1  # shift 1 bit to rigth
-        value = self.wrap(value)
-
+            self._rmw(mode, _rmw_lsr)
 
-        # Put the value into the accumulator or memory
-        if mode == Mode.ACCUMULATOR:
-            self.a = value
-        else:
-            self.bus.write(loc, value)
-        
-        # Set nz
-        self.set_nz(value)        
-
-        
     # ROL
     def ROL(self, mode):
         if mode == Mode.ACCUMULATOR:
-            value = self.a
-        else:
-            loc = self.get_location_by_mode(mode)
-            value = self.bus.read(loc)
-        
-        # Check carry bit
-        temp = 0
-        if self.c == True:
-            temp = 1
-        
-        # Check the leftmost bit
-        if value & 128 == 128:
-            self.c = True
-        else:
-            self.c = False  
-        
-        # Shift Left
-        value = value << 1  # shift 1 bit to left
-        value = self.wrap(value)
-
-        # Add the carry
-        value = value | temp
-
-
-        # Put the value into the accumulator or memory
-        if mode == Mode.ACCUMULATOR:
-            self.a = value
+            self._rol_accumulator(mode)
         else:
-            self.bus.write(loc, value)
-        
-        # Set nz
-        self.set_nz(value)        
-
+            self._rmw(mode, _rmw_rol)
 
     # ROR
     def ROR(self, mode):
         if mode == Mode.ACCUMULATOR:
-            value = self.a
-        else:
-            loc = self.get_location_by_mode(mode)
-            value = self.bus.read(loc)
-        
-        # Check carry bit
-        temp = 0
-        if self.c == True:
-            temp = 128
-        
-        # Check the rightmost bit
-        if value & 1 == 1:
-            self.c = True
-        else:
-            self.c = False  
-        
-        # Shift Right
-        value = value >> 1  # shift 1 bit to right
-        value = self.wrap(value)
-
-        # Add the carry
-        value = value | temp
-
-
-        # Put the value into the accumulator or memory
-        if mode == Mode.ACCUMULATOR:
-            self.a = value
+            self._ror_accumulator(mode)
         else:
-            self.bus.write(loc, value)
-        
-        # Set nz
-        self.set_nz(value)        
-
- 
-
-
+            self._rmw(mode, _rmw_ror)
+
+    # Accumulator forms of the shifts. The dispatch table calls these directly
+    # for $0A, $4A, $2A and $6A, so they skip the mode check above.
+    def _asl_accumulator(self, mode):
+        a = self.a
+        # Only sets the carry, it is never cleared here
+        if a & 0x80:
+            self.p |= FLAG_C
+        self.a = a = (a << 1) & 0xFF
+        self.p = (self.p & 0x7D) | NZ_TABLE[a]
+
+    def _lsr_accumulator(self, mode):
+        a = self.a
+        # Only sets the carry, it is never cleared here
+        if a & 0x01:
+            self.p |= FLAG_C
+        self.a = a = a >> 1
+        self.p = (self.p & 0x7D) | NZ_TABLE[a]
+
+    def _rol_accumulator(self, mode):
+        a = self.a
+        p = self.p
+        result = ((a << 1) | (p & FLAG_C)) & 0xFF
+        self.a = result
+        self.p = (p & 0x7C) | (a >> 7) | NZ_TABLE[result]
+
+    def _ror_accumulator(self, mode):
+        a = self.a
+        p = self.p
+        result = (a >> 1) | ((p & FLAG_C) << 7)
+        self.a = result
+        self.p = (p & 0x7C) | (a & 0x01) | NZ_TABLE[result]
 
     # Testing /Debugging
     def push(self, value):        
@@ -990,73 +1149,55 @@ class CPU:
     
     def disassemble(self, addr):
         """Disassembles a single instruction at a given address."""
-        opcode = self.bus.read(addr)
-        
-        if opcode not in self.commands:
-            return f"${addr:04X}: {opcode:02X}       ???"
-
-        mnemonic = self.commands[opcode]['f'].__name__
-        mode = self.commands[opcode]['m']
-        
-        operand_str = ""
-        if mode == Mode.IMMEDIATE:
-            operand_str = f"#${self.bus.read(addr + 1):02X}"
-        elif mode == Mode.ZEROPAGE:
-            operand_str = f"${self.bus.read(addr + 1):02X}"
-        elif mode == Mode.ZEROPAGEX:
-            operand_str = f"${self.bus.read(addr + 1):02X},X"
-        elif mode == Mode.ZEROPAGEY:
-            operand_str = f"${self.bus.read(addr + 1):02X},Y"
-        elif mode == Mode.ABSOLUTE:
-            lsb = self.bus.read(addr + 1)
-            msb = self.bus.read(addr + 2)
-            operand_str = f"${(msb << 8) | lsb:04X}"
-        elif mode == Mode.ABSOLUTEX:
-            lsb = self.bus.read(addr + 1)
-            msb = self.bus.read(addr + 2)
-            operand_str = f"${(msb << 8) | lsb:04X},X"
-        elif mode == Mode.ABSOLUTEY:
-            lsb = self.bus.read(addr + 1)
-            msb = self.bus.read(addr + 2)
-            operand_str = f"${(msb << 8) | lsb:04X},Y"
-        elif mode == Mode.INDIRECT:
-            lsb = self.bus.read(addr + 1)
-            msb = self.bus.read(addr + 2)
-            operand_str = f"(${(msb << 8) | lsb:04X})"
-        elif mode == Mode.INDIRECTX:
-            operand_str = f"(${self.bus.read(addr + 1):02X},X)"
-        elif mode == Mode.INDIRECTY:
-            operand_str = f"(${self.bus.read(addr + 1):02X}),Y"
+        # Bytes past the end of memory read as 0
+        data = self.bus.read_block(addr, min(addr + 3, 0x10000)) + bytes(2)
+        return self._format_instruction(addr, data, 0)[0]
+
+    def _decode_instruction(self, addr, data, i):
+        """
+        Decodes the instruction at data[i], which was read from addr.
+        Returns the mnemonic, the operand text and the number of bytes the instruction takes.
+        The mnemonic is None for an unknown opcode.
+        """
+        opcode = data[i]
+        definition = self.commands.get(opcode)
+        if definition is None:
+            return None, "", 1
+
+        mode = definition['m']
+        length = self.increments.get(mode, 1)
+        if length == 3:
+            operand = data[i + 1] | (data[i + 2] << 8)
         elif mode == Mode.RELATIVE:
-            offset = self.bus.read(addr + 1)
-            if offset >= 128: offset -= 256
-            target = addr + 2 + offset
-            operand_str = f"${target:04X}"
+            operand = addr + 2 + SIGNED_BYTE[data[i + 1]]
+        else:
+            operand = data[i + 1]
+
+        return self.mnemonics[opcode], OPERAND_FORMATS[mode].format(operand), length
 
-        return f"${addr:04X}: {mnemonic} {operand_str}"
+    def _format_instruction(self, addr, data, i):
+        """
+        Disassembles the instruction at data[i], which was read from addr.
+        Returns the text and the number of bytes the instruction takes.
+        """
+        mnemonic, operand_str, length = self._decode_instruction(addr, data, i)
+        if mnemonic is None:
+            return f"${addr:04X}: {data[i]:02X}       ???", 1
+        return f"${addr:04X}: {mnemonic} {operand_str}", length
 
     def _display_memory(self, start_addr, length=32):
         """Displays a block of memory in hex and ASCII format."""
-        print(f"--- Memory View from ${start_addr:04X} ---")
-        for i in range(0, length, 16):
-            current_addr = start_addr + i
-            if current_addr > 0xFFFF:
-                break
-            
-            # Read 16 bytes or fewer if near end of memory
-            bytes_to_read = min(16, 0x10000 - current_addr)
-            if bytes_to_read <= 0:
-                break
-
-            data_hex = []
-            data_ascii = []
-            for j in range(bytes_to_read):
-                byte = self.bus.read(current_addr + j)
-                data_hex.append(f"{byte:02X}")
-                data_ascii.append(chr(byte) if 0x20 <= byte <= 0x7E else '.')
-            
-            print(f"${current_addr:04X}: {' '.join(data_hex).ljust(48)} | {''.join(data_ascii)}")
-        print("--------------------------")
+        # Whole rows of 16 bytes, or fewer if near end of memory
+        end_addr = min(start_addr + -(-length // 16) * 16, 0x10000)
+        data = self.bus.read_block(start_addr, end_addr)
+
+        lines = [f"--- Memory View from ${start_addr:04X} ---"]
+        for i in range(0, len(data), 16):
+            row = data[i:i + 16]
+            data_ascii = row.translate(PRINTABLE_ASCII).decode('ascii')
+            lines.append(f"${start_addr + i:04X}: {row.hex(' ').upper().ljust(48)} | {data_ascii}")
+        lines.append("--------------------------\n")
+        sys.stdout.write("\n".join(lines))
 
     def _search_memory(self, sequence):
         """Searches for a byte sequence in memory and prints found addresses."""
@@ -1064,25 +1205,24 @@ class CPU:
             print("Search sequence cannot be empty.")
             return
 
-        sequence_str = ' '.join(f'{b:02X}' for b in sequence)
-        print(f"Searching for sequence: {sequence_str}...")
+        pattern = bytes(sequence)
+        sequence_str = pattern.hex(' ').upper()
 
+        # Take one snapshot of the address space and let bytes.find() do the scan
+        memory = self.bus.read_block(0, 0x10000)
         found_addresses = []
-        seq_len = len(sequence)
-        for addr in range(0x10000 - seq_len + 1):
-            match = True
-            for i in range(seq_len):
-                if self.bus.read(addr + i) != sequence[i]:
-                    match = False
-                    break
-            if match:
-                found_addresses.append(addr)
+        addr = memory.find(pattern)
+        while addr != -1:
+            found_addresses.append(addr)
+            addr = memory.find(pattern, addr + 1)
 
+        # Build the whole report first and write it in one call
         if found_addresses:
-            print(f"Found {len(found_addresses)} match(es) at:")
-            print(' '.join(f'${addr:04X}' for addr in found_addresses))
+            addresses = ' '.join(f'${addr:04X}' for addr in found_addresses)
+            result = f"Found {len(found_addresses)} match(es) at:\n{addresses}\n"
         else:
-            print("Sequence not found.")
+            result = "Sequence not found.\n"
+        sys.stdout.write(f"Searching for sequence: {sequence_str}...\n{result}")
 
     def _set_register(self, register, value):
         """Sets the value of a CPU register."""
@@ -1102,6 +1242,8 @@ class CPU:
             self.pc = value & 0xFFFF
         elif register == "sp":
             self.sp = value & 0xFF
+        elif register == "p":
+            self.p = value & 0xEF # Bit 4 only exists on the stack, as in PLP
         else:
             print(f"Invalid register: {register}")
             return
@@ -1111,20 +1253,18 @@ class CPU:
     def _disassemble_range(self, start_addr, num_instructions=10):
         """Disassembles a range of instructions."""
         print(f"--- Disassembly from ${start_addr:04X} ---")
-        addr = start_addr
+        # Read the whole range in one go; no instruction is longer than 3 bytes.
+        # Bytes past the end of memory read as 0.
+        data = self.bus.read_block(start_addr, min(start_addr + num_instructions * 3, 0x10000)) + bytes(2)
+        i = 0
         for _ in range(num_instructions):
+            addr = start_addr + i
             if addr > 0xFFFF:
                 break
             
-            disassembly_line = self.disassemble(addr)
+            disassembly_line, length = self._format_instruction(addr, data, i)
             print(disassembly_line)
-            
-            opcode = self.bus.read(addr)
-            if opcode in self.commands:
-                mode = self.commands[opcode]['m']
-                addr += self.increments.get(mode, 1)
-            else:
-                addr += 1 # If opcode is unknown, just advance by one byte
+            i += length # Unknown opcodes advance by one byte
         print("-----------------------------")
 
     def _backtrace(self):
@@ -1139,37 +1279,65 @@ class CPU:
         print(f"  #{frame_count}: {self.disassemble(self.pc)}")
         frame_count += 1
 
+        # Read the stack page once, plus the two bytes the last frame can reach past it
+        stack = self.bus.read_block(0x0100, 0x0202)
+
         # Unwind the stack, looking for JSR return addresses
         while current_sp < 0xFF:
             # A JSR pushes a 2-byte return address (PC+2). RTS pulls it and jumps to (addr+1).
             # So, the address on the stack points to the last byte of the JSR instruction.
-            lsb = self.bus.read(0x0100 + current_sp + 1)
-            msb = self.bus.read(0x0100 + current_sp + 2)
-            return_addr = (msb << 8) | lsb
+            return_addr = stack[current_sp + 1] | (stack[current_sp + 2] << 8)
+
+            # Only accept it if there is a JSR opcode where the call would have been.
+            # Anything else is data pushed with PHA/PHP, so move on by one byte.
+            if self.bus.read((return_addr - 2) & 0xFFFF) != 0x20:
+                current_sp += 1
+                continue
+
             print(f"  #{frame_count}: (JSR from ${return_addr - 2:04X}) -> returns to ${return_addr + 1:04X}")
             current_sp += 2
             frame_count += 1
         print("------------------------------")
 
+    def format_status(self):
+        """Returns the registers and flags as the one-line status shown by the debugger and the trace."""
+        pc = self.pc
+        return (f"A:{HEX_BYTE[self.a]} X:{HEX_BYTE[self.x]} Y:{HEX_BYTE[self.y]} "
+                f"PC:{HEX_BYTE[(pc >> 8) & 0xFF]}{HEX_BYTE[pc & 0xFF]} SP:{HEX_BYTE[self.sp]}"
+                f"  Flags: {FLAG_TEXT[self.p & 0xFF]}")
+
+    @staticmethod
+    def _status_from_state(cpu_state):
+        """Returns the packed status register from a saved CPU state."""
+        if 'p' in cpu_state:
+            return cpu_state['p']
+        # Older save files store one boolean per flag
+        p = 0
+        for name, flag in (('n', FLAG_N), ('v', FLAG_V), ('b', FLAG_B), ('d', FLAG_D),
+                           ('i', FLAG_I), ('z', FLAG_Z), ('c', FLAG_C)):
+            if cpu_state[name]:
+                p |= flag
+        return p
+
     def _save_state(self, filename):
         """Saves the current emulator state to a file."""
         state = {
             'cpu': {
                 'a': self.a, 'x': self.x, 'y': self.y,
                 'pc': self.pc, 'sp': self.sp,
-                'n': self.n, 'v': self.v, 'b': self.b,
-                'd': self.d, 'i': self.i, 'z': self.z, 'c': self.c,
+                'p': self.p,
                 'total_cycles': self.total_cycles,
             },
-            'ram': self.bus.memory.ram,
+            'ram': bytes(self.bus.memory.ram),
             'vic': self.bus.vic.save_state(),
             'sid': self.bus.sid.save_state(),
             'cia1': self.bus.cia1.save_state(),
             'cia2': self.bus.cia2.save_state()
         }
         try:
-            with open(filename, 'w') as f:
-                json.dump(state, f, indent=4)
+            # pickle stores the RAM as raw bytes, where JSON needed a list of 65536 ints
+            with open(filename, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
             print(f"Emulator state saved to '{filename}'.")
             # Add a small visual confirmation in the GUI title
             if 'pygame' in sys.modules:
@@ -1182,30 +1350,39 @@ class CPU:
         """Captures the current emulator state into a dictionary for rewinding."""
         # This is similar to _save_state but returns the dictionary directly
         # without writing to a file.
+        # RAM as 256 rows of one page each, so the dirty pages are gathered in one go
+        ram_pages = np.frombuffer(self.bus.memory.ram, dtype=np.uint8).reshape(256, 256)
+        dirty_pages = np.flatnonzero(np.frombuffer(self.bus.dirty_pages, dtype=np.uint8))
         state = {
             'cpu': {
                 'a': self.a, 'x': self.x, 'y': self.y,
                 'pc': self.pc, 'sp': self.sp,
-                'n': self.n, 'v': self.v, 'b': self.b,
-                'd': self.d, 'i': self.i, 'z': self.z, 'c': self.c,
+                'p': self.p,
                 'total_cycles': self.total_cycles,
             },
-            # Store only the *changes* in RAM since the last capture
-            'ram_changes': {addr: self.bus.memory.ram[addr] for addr in self.bus.memory_dirty_flags},
-            # Clear the dirty flags *after* capturing the changes
-            'dirty_flags': list(self.bus.memory_dirty_flags),
+            # Store only the pages of RAM changed since the last capture,
+            # back to back in the order of dirty_pages
+            'ram_pages': ram_pages[dirty_pages].tobytes(),
+            'dirty_pages': dirty_pages.tolist(),
             'vic': self.bus.vic.save_state(),
             'sid': self.bus.sid.save_state(),
             'cia1': self.bus.cia1.save_state(),
             'cia2': self.bus.cia2.save_state()
         }
+        # Clear the dirty flags *after* capturing the changes
+        self.bus.dirty_pages[:] = bytes(256)
         return state
 
     def _restore_state(self, filename):
         """Restores the emulator state from a file."""
         try:
-            with open(filename, 'r') as f:
-                state = json.load(f)
+            with open(filename, 'rb') as f:
+                data = f.read()
+            # State files from older versions are JSON
+            if data.lstrip()[:1] == b'{':
+                state = json.loads(data)
+            else:
+                state = pickle.loads(data)
             
             cpu_state = state['cpu']
             self.a = cpu_state['a']
@@ -1215,22 +1392,22 @@ class CPU:
 
             self.pc = cpu_state['pc']
             self.sp = cpu_state['sp']
-            self.n = cpu_state['n']
-            self.v = cpu_state['v']
-            self.b = cpu_state['b']
-            self.d = cpu_state['d']
-            self.i = cpu_state['i']
-            self.z = cpu_state['z']
-            self.c = cpu_state['c']
+            self.p = self._status_from_state(cpu_state)
             self.total_cycles = cpu_state.get('total_cycles', 0) # Use .get for backward compatibility
 
-            # Restore only the *changed* memory locations
-            ram_changes = state.get('ram_changes', {})
-            for addr, value in ram_changes.items():
-                self.bus.memory.ram[addr] = value
+            if 'ram' in state:
+                self.bus.memory.ram[:] = bytes(state['ram'])
 
-            # Clear the dirty flags *after* restoring the RAM
-            self.bus.memory_dirty_flags = set(state.get('dirty_flags', []))
+            # Restore only the *changed* memory pages
+            ram_changes = state.get('ram_changes', {})
+            for addr, page_data in ram_changes.items():
+                addr = int(addr) # JSON keys are strings
+                self.bus.memory.ram[addr:addr + len(page_data)] = bytes(page_data)
+
+            # Restore the dirty flags *after* restoring the RAM
+            self.bus.dirty_pages[:] = bytes(256)
+            for page in state.get('dirty_pages', []):
+                self.bus.dirty_pages[page] = 1
             self.bus.vic.restore_state(state['vic'])
             self.bus.sid.restore_state(state['sid'])
             self.bus.cia1.restore_state(state['cia1'])
@@ -1245,7 +1422,9 @@ class CPU:
             self.debug_prompt() # Re-enter debugger to show new state
         except FileNotFoundError:
             print(f"Error: State file '{filename}' not found.")
-        except (IOError, json.JSONDecodeError, KeyError) as e:
+        except (IOError, EOFError, ValueError, AttributeError, ImportError,
+                json.JSONDecodeError, pickle.UnpicklingError, KeyError) as e:
+            # A truncated or corrupt pickle can also raise EOFError, ValueError, AttributeError or ImportError
             print(f"Error restoring state: {e}")
 
     def _restore_state_from_dict(self, state):
@@ -1257,17 +1436,13 @@ class CPU:
             self.y = cpu_state['y']
             self.pc = cpu_state['pc']
             self.sp = cpu_state['sp']
-            self.n = cpu_state['n']
-            self.v = cpu_state['v']
-            self.b = cpu_state['b']
-            self.d = cpu_state['d']
-            self.i = cpu_state['i']
-            self.z = cpu_state['z']
-            self.c = cpu_state['c']
+            self.p = cpu_state['p']
             self.total_cycles = cpu_state.get('total_cycles', 0)
 
-            for addr, value in state.get('ram_changes', {}).items():
-                self.bus.memory.ram[int(addr)] = value # JSON keys are strings
+            dirty_pages = state['dirty_pages']
+            if dirty_pages:
+                ram_pages = np.frombuffer(self.bus.memory.ram, dtype=np.uint8).reshape(256, 256)
+                ram_pages[dirty_pages] = np.frombuffer(state['ram_pages'], dtype=np.uint8).reshape(-1, 256)
 
             self.bus.vic.restore_state(state['vic'])
             self.bus.sid.restore_state(state['sid'])
@@ -1288,8 +1463,8 @@ class CPU:
         filename_addr = self.bus.read(0xBB) | (self.bus.read(0xBC) << 8)
 
         # Read filename from memory
-        filename_bytes = [self.bus.read(filename_addr + i) for i in range(filename_len)]
-        filename = bytes(filename_bytes).decode('petscii-c64en-lc', errors='ignore')
+        filename_bytes = self.bus.read_block(filename_addr, filename_addr + filename_len)
+        filename = filename_bytes.decode('petscii-c64en-lc', errors='ignore')
 
         print(f"HLE: Intercepted KERNAL LOAD for file '{filename}'")
 
@@ -1302,16 +1477,15 @@ class CPU:
             program_data = file_data[2:]
             
             # Write program data to RAM
-            for i, byte in enumerate(program_data):
-                self.bus.write(load_addr + i, byte)
+            self.bus.write_block(load_addr, program_data)
             
             print(f"HLE: Loaded {len(program_data)} bytes to ${load_addr:04X}")
-            self.c = False # Set Carry to indicate success
+            self.p &= ~FLAG_C # Clear Carry to indicate success
             self.pc += 2 # Simulate RTS by advancing PC past the JSR instruction
             return True
         else:
             print(f"HLE: File '{filename}' not found.")
-            self.c = True # Set Carry to indicate error
+            self.p |= FLAG_C # Set Carry to indicate error
             self.pc += 2
             return True
 
@@ -1326,8 +1500,8 @@ class CPU:
         filename_addr = self.bus.read(0xBB) | (self.bus.read(0xBC) << 8)
 
         # Read filename from memory
-        filename_bytes = [self.bus.read(filename_addr + i) for i in range(filename_len)]
-        filename = bytes(filename_bytes).decode('petscii-c64en-lc', errors='ignore')
+        filename_bytes = self.bus.read_block(filename_addr, filename_addr + filename_len)
+        filename = filename_bytes.decode('petscii-c64en-lc', errors='ignore')
 
         # For SAVE, the start address is in A (lsb) and X (msb) on entry.
         # However, BASIC sets up pointers in zero page. Let's use those.
@@ -1340,193 +1514,257 @@ class CPU:
 
         # Prepare data to save (including the 2-byte load address header)
         data_to_save = bytearray([start_addr & 0xFF, start_addr >> 8])
-        data_to_save.extend([self.bus.read(i) for i in range(start_addr, end_addr)])
+        data_to_save += self.bus.read_block(start_addr, end_addr)
 
         if self.bus.drive.save_file(filename, data_to_save):
-            self.c = False # Success
+            self.p &= ~FLAG_C # Success
         else:
-            self.c = True # Error
+            self.p |= FLAG_C # Error
         self.pc += 2 # Simulate RTS
         return True
 
+    def _flush_trace(self):
+        """Writes the pending trace lines and flushes trace.log to disk."""
+        if self._trace_lines:
+            self.trace_file.write(''.join(self._trace_lines))
+            self._trace_lines.clear()
+        self.trace_file.flush()
+
+    def close_trace(self):
+        """Stops tracing and closes trace.log, flushing what is still buffered."""
+        self.tracing = False
+        if self.trace_file:
+            self._flush_trace()
+            self.trace_file.close()
+            self.trace_file = None
+        self._update_events()
+
     def debug_prompt(self):
         """Enters the interactive debugger."""
+        # Make the trace up to this point visible while we are stopped
+        if self.trace_file:
+            self._flush_trace()
         print("--- DEBUGGER ---")
-        status = f"A:{self.a:02X} X:{self.x:02X} Y:{self.y:02X} PC:{self.pc:04X} SP:{self.sp:02X}"
-        flags = f"  Flags: {'N' if self.n else '-'} {'V' if self.v else '-'} {'B' if self.b else '-'} {'D' if self.d else '-'} {'I' if self.i else '-'} {'Z' if self.z else '-'} {'C' if self.c else '-'}"
-        print(status + flags)
+        print(self.format_status())
         
         if self.auto_dasm_on_break:
             self._disassemble_range(self.pc, 5)
         else:
             print(f"Next -> {self.disassemble(self.pc)}")
         
+        if readline and readline.get_completer() is not _complete_debug_command:
+            readline.set_history_length(1000)
+            readline.set_completer(_complete_debug_command)
+            readline.parse_and_bind("tab: complete")
+
+        command = ""
         while True:
-            command = input("> ").strip()
-            if command == "" or command == "s" or command == "step":
+            # Split the line once; the handlers get the words after the command name
+            parts = input("> ").split()
+            if not parts:
+                break # An empty line steps
+            command, args = parts[0], parts[1:]
+            handler = self._debug_commands.get(command)
+            if handler is None:
+                print("Unknown command. Type 'h' or 'help' for a list of commands.")
+            elif handler(self, args):
                 break
-            elif command.startswith("b "):
-                parts = command.split()
-                if len(parts) > 1 and parts[1] == "clear":
-                    if len(parts) > 2 and parts[2] == "all":
-                        self.breakpoints.clear()
-                        print("All breakpoints cleared.")
-                    elif len(parts) > 2:
-                        try:
-                            addr_to_clear = int(parts[2], 16)
-                            if addr_to_clear in self.breakpoints:
-                                self.breakpoints.remove(addr_to_clear)
-                                print(f"Breakpoint at ${addr_to_clear:04X} cleared.")
-                            else:
-                                print(f"No breakpoint found at ${addr_to_clear:04X}.")
-                        except ValueError:
-                            print("Invalid address for 'b clear'.")
-                    else:
-                        print("Usage: 'b clear <addr>' or 'b clear all'.")
-                elif len(parts) == 2:
-                    try:
-                        addr = int(parts[1], 16)
-                        self.breakpoints.add(addr)
-                        print(f"Breakpoint set at ${addr:04X}")
-                    except (ValueError, IndexError):
-                        print("Invalid address.")
-
-            elif command.startswith("m "):
-                try:
-                    parts = command.split(" ")
-                    start_addr = int(parts[1], 16)
-                    length = int(parts[2]) if len(parts) > 2 else 32
-                    self._display_memory(start_addr, length)
-                except (ValueError, IndexError):
-                    print("Invalid memory command. Use 'm <address> [length]' (e.g., 'm 0200 64').")
-            elif command.startswith("set "):
-                try:
-                    parts = command.split(" ")
-                    address = int(parts[1], 16)
-                    value = int(parts[2], 16)
-                    self.bus.write(address, value)
-                    print(f"Set memory at ${address:04X} to ${value:02X}")
-                except (ValueError, IndexError):
-                    print("Invalid set command. Use 'set <address> <value>' (e.g., 'set 8000 0A').")
-            elif command.startswith("search ") or command.startswith("find "):
-                try:
-                    parts = command.split(" ")[1:]
-                    if not parts:
-                        raise ValueError
-                    byte_sequence = [int(p, 16) for p in parts]
-                    self._search_memory(byte_sequence)
-                except (ValueError, IndexError):
-                    print("Invalid search command. Use 'search <byte1> <byte2> ...' (e.g., 'search A9 10 AA').")
-            elif command.startswith("reg "):
-                try:
-                    parts = command.split(" ")
-                    register = parts[1].lower()
-                    value = parts[2]
-                    self._set_register(register, value)
-                except (ValueError, IndexError):
-                    print("Invalid reg command. Use 'reg <register> <value>' (e.g., 'reg a 0A').")
-
-            elif command.startswith("dasm "):
-                try:
-                    parts = command.split(" ")
-                    start_addr = int(parts[1], 16)
-                    num_instructions = int(parts[2]) if len(parts) > 2 else 10
-                    self._disassemble_range(start_addr, num_instructions)
-                except (ValueError, IndexError):
-                    print("Invalid disassemble command. Use 'dasm <address> [num_instructions]' (e.g., 'dasm 8000 5').")
-            elif command == "autodasm":
-                self.auto_dasm_on_break = not self.auto_dasm_on_break
-                if self.auto_dasm_on_break:
-                    print("Auto-disassembly on break is now ON.")
-                else:
-                    print("Auto-disassembly on break is now OFF.")
-
-            elif command == "trace":
-                if not self.tracing:
-                    try:
-                        self.trace_file = open("trace.log", "w")
-                        self.tracing = True
-                        print("Tracing started. Output will be written to trace.log. Use 'c' to run.")
-                    except IOError:
-                        print("Error: Could not open trace.log for writing.")
-                else:
-                    self.tracing = False
-                    if self.trace_file:
-                        self.trace_file.close()
-                        self.trace_file = None
-                    print("Tracing stopped.")
-
-            elif command == "flags":
-                print("--- CPU Flags ---")
-                print(f"  N (Negative) : {int(self.n)}")
-                print(f"  V (Overflow) : {int(self.v)}")
-                print(f"  - (Unused)   : 1")
-                print(f"  B (Break)    : {int(self.b)}")
-                print(f"  D (Decimal)  : {int(self.d)}")
-                print(f"  I (Interrupt): {int(self.i)}")
-                print(f"  Z (Zero)     : {int(self.z)}")
-                print(f"  C (Carry)    : {int(self.c)}")
-                print("-----------------")
-
-            elif command == "breakpoints" or command == "blist":
-                if not self.breakpoints:
-                    print("No active breakpoints.")
-                else:
-                    print("Active breakpoints:")
-                    sorted_bps = sorted(list(self.breakpoints))
-                    print(' '.join(f'${addr:04X}' for addr in sorted_bps))
+        
+        if command == "c" or command == "continue":
+            # Run past the breakpoint we are on without removing it
+            self._skip_breakpoint = self.pc
 
-            elif command == "c" or command == "continue":
-                break
-            elif command == "stack":
-                # The 6502 stack is on page 1 (0x0100 - 0x01FF) and grows downwards.
-                # self.sp points to the next free byte.
-                # The items currently on the stack are from sp+1 to 0xFF.
-                stack_start = 0x0100 + self.sp + 1
-                stack_size = 0xFF - self.sp
-                print(f"--- Stack (SP is at ${0x0100 + self.sp:04X}) ---")
-                if stack_size > 0:
-                    self._display_memory(stack_start, stack_size)
-            elif command == "h" or command == "help":
-                print("Debugger commands:")
-                print("  s (step)        - Execute current instruction and break on next.")
-                print("  c (continue)    - Continue execution until next breakpoint.")
-                print("  b <addr>        - Set a breakpoint (e.g., b 8000).")
-                print("  b clear <addr>  - Clear a specific breakpoint.")
-                print("  b clear all     - Clear all breakpoints.")
-                print("  blist           - List all active breakpoints.")
-                print("  m <addr> [len]  - Display memory from hex address (e.g., m 0200 32).")
-                print("  save [filename] - Save emulator state (default: emustate.json).")
-                print("  load [filename] - Restore emulator state (default: emustate.json).")
-                print("  h (help)        - Show this help message.")
-                print("  dasm <addr> [n] - Disassemble n instructions from address (e.g., dasm 8000 5).")
-                print("  find <b1> [b2]..- Search for a byte sequence in memory (e.g., find A9 20 85 30).")
-                print("  autodasm        - Toggle automatic disassembly when a breakpoint is hit.")
-                print("  reg <reg> <value> - Set CPU register to value (e.g., reg a 0A).")
-                print("  set <addr> <value> - Set memory at hex address to hex value (e.g., set 8000 0A).")
-                print("  flags           - Show a detailed view of the status flags.")
-                print("  stack           - Display the current contents of the stack.")
-                print("  bt              - Show a backtrace of the call stack.")
-                print("  trace           - Toggle instruction tracing to trace.log.")
-                print("  cycles          - Show the total cycle count.")
-            elif command.startswith("save"):
-                parts = command.split()
-                filename = parts[1] if len(parts) > 1 else "emustate.json"
-                self._save_state(filename)
-            elif command.startswith("load") or command.startswith("restore"):
-                parts = command.split()
-                filename = parts[1] if len(parts) > 1 else "emustate.json"
-                self._restore_state(filename)
-                # After restoring, we break the loop to re-evaluate the new state
-                break
-            elif command == "bt" or command == "callstack":
-                self._backtrace()
+        # Breakpoints and tracing may have changed in the debugger
+        self._update_events()
+
+    # --- Debugger commands ---
+    # Each takes the arguments after the command name and returns True
+    # to leave the debugger and resume execution. See _debug_commands below the class.
+    def _cmd_step(self, args):
+        return True
 
+    def _cmd_continue(self, args):
+        return True
 
+    def _cmd_break(self, args):
+        if args and args[0] == "clear":
+            if len(args) > 1 and args[1] == "all":
+                self.clear_breakpoints()
+                print("All breakpoints cleared.")
+            elif len(args) > 1:
+                try:
+                    addr_to_clear = int(args[1], 16)
+                    if addr_to_clear in self.breakpoints:
+                        self.remove_breakpoint(addr_to_clear)
+                        print(f"Breakpoint at ${addr_to_clear:04X} cleared.")
+                    else:
+                        print(f"No breakpoint found at ${addr_to_clear:04X}.")
+                except ValueError:
+                    print("Invalid address for 'b clear'.")
             else:
-                print("Unknown command. Type 'h' or 'help' for a list of commands.")
-        
-        if command == "c" or command == "continue":
-            # To continue, we need to remove the current breakpoint if we are on one
-            if self.pc in self.breakpoints:
-                self.breakpoints.remove(self.pc)
+                print("Usage: 'b clear <addr>' or 'b clear all'.")
+        elif len(args) == 1:
+            try:
+                addr = int(args[0], 16)
+                self.add_breakpoint(addr)
+                print(f"Breakpoint set at ${addr:04X}")
+            except ValueError:
+                print("Invalid address.")
+        else:
+            print("Usage: 'b <addr>', 'b clear <addr>' or 'b clear all'.")
+
+    def _cmd_blist(self, args):
+        if not self.breakpoints:
+            print("No active breakpoints.")
+        else:
+            print("Active breakpoints:")
+            print(' '.join(f'${addr:04X}' for addr in self._sorted_bps))
+
+    def _cmd_memory(self, args):
+        try:
+            start_addr = int(args[0], 16)
+            length = int(args[1]) if len(args) > 1 else 32
+            self._display_memory(start_addr, length)
+        except (ValueError, IndexError):
+            print("Invalid memory command. Use 'm <address> [length]' (e.g., 'm 0200 64').")
+
+    def _cmd_set(self, args):
+        try:
+            address = int(args[0], 16)
+            value = int(args[1], 16)
+            self.bus.write(address, value)
+            print(f"Set memory at ${address:04X} to ${value:02X}")
+        except (ValueError, IndexError):
+            print("Invalid set command. Use 'set <address> <value>' (e.g., 'set 8000 0A').")
+
+    def _cmd_search(self, args):
+        if not args:
+            print(SEARCH_USAGE)
+            return
+        try:
+            # bytes() rejects values outside 00-FF with a ValueError
+            self._search_memory(bytes(int(p, 16) for p in args))
+        except ValueError:
+            print(SEARCH_USAGE)
+
+    def _cmd_reg(self, args):
+        try:
+            self._set_register(args[0].lower(), args[1])
+        except (ValueError, IndexError):
+            print("Invalid reg command. Use 'reg <register> <value>' (e.g., 'reg a 0A').")
+
+    def _cmd_dasm(self, args):
+        try:
+            start_addr = int(args[0], 16)
+            num_instructions = int(args[1]) if len(args) > 1 else 10
+            self._disassemble_range(start_addr, num_instructions)
+        except (ValueError, IndexError):
+            print("Invalid disassemble command. Use 'dasm <address> [num_instructions]' (e.g., 'dasm 8000 5').")
+
+    def _cmd_autodasm(self, args):
+        self.auto_dasm_on_break = not self.auto_dasm_on_break
+        if self.auto_dasm_on_break:
+            print("Auto-disassembly on break is now ON.")
+        else:
+            print("Auto-disassembly on break is now OFF.")
+
+    def _cmd_trace(self, args):
+        if not self.tracing:
+            try:
+                # trace.log is opened once per session and stays open across toggles,
+                # so later trace runs append to it instead of reopening the file.
+                # A 1 MB buffer turns one write per instruction into a few large writes.
+                # It is flushed whenever the debugger is entered or tracing stops.
+                if not self.trace_file:
+                    self.trace_file = open("trace.log", "w", buffering=TRACE_BUFFER_SIZE)
+                self.tracing = True
+                print("Tracing started. Output will be written to trace.log. Use 'c' to run.")
+            except IOError:
+                print("Error: Could not open trace.log for writing.")
+        else:
+            self.tracing = False
+            if self.trace_file:
+                self._flush_trace()
+            print("Tracing stopped.")
+
+    def _cmd_flags(self, args):
+        p = self.p
+        sys.stdout.write(FLAGS_VIEW % (
+            (p >> 7) & 1, (p >> 6) & 1, (p >> 5) & 1, (p >> 3) & 1,
+            (p >> 2) & 1, (p >> 1) & 1, p & 1))
+
+    def _cmd_stack(self, args):
+        # The 6502 stack is on page 1 (0x0100 - 0x01FF) and grows downwards.
+        # self.sp points to the next free byte.
+        # The items currently on the stack are from sp+1 to 0xFF.
+        stack_start = 0x0100 + self.sp + 1
+        stack_size = 0xFF - self.sp
+        print(f"--- Stack (SP is at ${0x0100 + self.sp:04X}) ---")
+        if stack_size > 0:
+            self._display_memory(stack_start, stack_size)
+
+    def _cmd_cycles(self, args):
+        print(f"Total cycles: {self.total_cycles}")
+
+    def _cmd_help(self, args):
+        sys.stdout.write(DEBUGGER_HELP)
+
+    # File names may contain spaces, so save and load take all remaining words
+    def _cmd_save(self, args):
+        filename = " ".join(args) if args else "emustate.state"
+        self._save_state(filename)
+
+    def _cmd_load(self, args):
+        filename = " ".join(args) if args else "emustate.state"
+        self._restore_state(filename)
+        # After restoring, we leave the prompt to re-evaluate the new state
+        return True
+
+    def _cmd_backtrace(self, args):
+        self._backtrace()
+
+
+def _build_instruction_table(commands, specialized):
+    """
+    Returns the per-opcode instruction descriptors for the dispatch in run_cycles():
+    (function, mode, base cycles, PC increment).
+    Opcodes in specialized run that function instead of the one in commands.
+    Unimplemented opcodes have no function (None).
+    """
+    table = [(None, Mode.IMPLIED, 2, 1)] * 256
+    for op, definition in commands.items():
+        mode = definition["m"]
+        f = specialized.get(op, definition["f"])
+        table[op] = (f, mode, CYCLE_COUNTS.get(op, 2), INSTRUCTION_INCREMENTS.get(mode, 1))
+    return table
+
+# The handlers in these tables are the plain functions from the class,
+# so the dispatcher passes the CPU instance explicitly.
+CPU.commands = get_opcode_definitions(CPU)
+CPU.mnemonics = {opcode: definition['f'].__name__ for opcode, definition in CPU.commands.items()}
+# commands keeps the generic handlers, whose names the disassemblers show.
+CPU._itbl = _build_instruction_table(CPU.commands, {
+    0x0A: CPU._asl_accumulator, 0x4A: CPU._lsr_accumulator,
+    0x2A: CPU._rol_accumulator, 0x6A: CPU._ror_accumulator,
+})
+
+# Debugger commands by name, see debug_prompt()
+CPU._debug_commands = {
+    "s": CPU._cmd_step, "step": CPU._cmd_step,
+    "c": CPU._cmd_continue, "continue": CPU._cmd_continue,
+    "b": CPU._cmd_break, "blist": CPU._cmd_blist, "breakpoints": CPU._cmd_blist,
+    "m": CPU._cmd_memory, "set": CPU._cmd_set,
+    "search": CPU._cmd_search, "find": CPU._cmd_search,
+    "reg": CPU._cmd_reg, "dasm": CPU._cmd_dasm, "autodasm": CPU._cmd_autodasm,
+    "trace": CPU._cmd_trace, "flags": CPU._cmd_flags, "stack": CPU._cmd_stack,
+    "cycles": CPU._cmd_cycles, "h": CPU._cmd_help, "help": CPU._cmd_help,
+    "save": CPU._cmd_save, "load": CPU._cmd_load, "restore": CPU._cmd_load,
+    "bt": CPU._cmd_backtrace, "callstack": CPU._cmd_backtrace,
+}
+
+def _complete_debug_command(text, state):
+    """readline completer that expands the first word of a line to a debugger command."""
+    if readline.get_begidx() != 0:
+        return None
+    matches = [name for name in CPU._debug_commands if name.startswith(text)]
+    return matches[state] if state < len(matches) else None
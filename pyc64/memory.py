@@ -1,5 +1,80 @@
 # pyc64/memory.py
 
+# Region tags for the bank maps below.
+REGION_RAM = 0
+REGION_BASIC = 1
+REGION_KERNAL = 2
+REGION_CHAR = 3
+REGION_VIC = 4
+REGION_SID = 5
+REGION_COLOR = 6
+REGION_CIA1 = 7
+REGION_CIA2 = 8
+REGION_ROM = 9 # Write-only tag: writes to a banked-in ROM are ignored
+REGION_PAGE0 = 10 # Zero page, which holds the processor port at $0000/$0001
+
+def _build_bank_maps():
+    """
+    Precomputes which region handles each 256-byte page for all 8 combinations
+    of the LORAM, HIRAM and CHAREN bits of the processor port.
+    Both tables are indexed by (bank_config << 8) | (address >> 8).
+    See: https://www.c64-wiki.com/wiki/Bank_Switching
+    """
+    read_map = bytearray(8 * 256)
+    write_map = bytearray(8 * 256)
+    for config in range(8):
+        loram = config & 1
+        hiram = (config >> 1) & 1
+        charen = (config >> 2) & 1
+        for page in range(256):
+            read_region = write_region = REGION_RAM
+            # $0000-$00FF: zero page, with the processor port at $0000/$0001
+            if page == 0x00:
+                read_region = write_region = REGION_PAGE0
+            # $A000-$BFFF: BASIC ROM or RAM
+            elif 0xA0 <= page <= 0xBF:
+                if loram and hiram:
+                    read_region = REGION_BASIC
+                    write_region = REGION_ROM
+            # $D000-$DFFF: I/O, Character ROM, or RAM
+            # Both are only visible if either LORAM or HIRAM is also active.
+            elif 0xD0 <= page <= 0xDF:
+                if loram or hiram:
+                    if charen: # I/O visible
+                        if page <= 0xD3: read_region = write_region = REGION_VIC
+                        elif page <= 0xD7: read_region = write_region = REGION_SID
+                        elif page <= 0xDB: read_region = write_region = REGION_COLOR
+                        elif page == 0xDC: read_region = write_region = REGION_CIA1
+                        elif page == 0xDD: read_region = write_region = REGION_CIA2
+                        # $DE00-$DFFF (I/O 1 and 2) are unmapped and fall through to RAM.
+                    else: # Character ROM visible
+                        read_region = REGION_CHAR
+                        # Writes go to the underlying RAM, except for Color RAM
+                        if 0xD8 <= page <= 0xDB:
+                            write_region = REGION_COLOR
+            # $E000-$FFFF: KERNAL ROM or RAM
+            elif page >= 0xE0:
+                if hiram:
+                    read_region = REGION_KERNAL
+                    write_region = REGION_ROM
+            read_map[(config << 8) | page] = read_region
+            write_map[(config << 8) | page] = write_region
+    return read_map, write_map
+
+READ_MAP, WRITE_MAP = _build_bank_maps()
+
+# $0100-$9FFF is plain RAM in every bank configuration, so reads in this
+# range can skip the memory map entirely.
+RAM_ONLY_START = 0x0100
+RAM_ONLY_END = 0xA000
+
+def _decode_words(rom):
+    """
+    Returns the little-endian word starting at every offset of rom.
+    The last offset has no second byte in the ROM and is left at 0.
+    """
+    return [rom[i] | (rom[i + 1] << 8) for i in range(len(rom) - 1)] + [0]
+
 class MemoryManager:
     """
     Handles the C64 memory map, including RAM, ROMs, and bank switching.
@@ -7,19 +82,61 @@ class MemoryManager:
     """
     def __init__(self, bus):
         self.bus = bus
-        # C64 has 64KB of RAM
-        self.ram = [0x00] * 0x10000
+        # C64 has 64KB of RAM.
+        # bytearrays keep one byte per cell and avoid boxing ints on every access.
+        self.ram = bytearray(0x10000)
         # ROMs
-        self.basic_rom = [0x00] * 0x2000  # 8KB
-        self.kernal_rom = [0x00] * 0x2000 # 8KB
-        self.char_rom = [0x00] * 0x1000   # 4KB
+        self.basic_rom = bytearray(0x2000)  # 8KB
+        self.kernal_rom = bytearray(0x2000) # 8KB
+        self.char_rom = bytearray(0x1000)   # 4KB
+        # Pre-decoded little-endian words at every ROM offset, so the CPU can read
+        # a 16-bit operand from ROM with one lookup. Rebuilt by load_rom().
+        self.basic_words = _decode_words(self.basic_rom)
+        self.kernal_words = _decode_words(self.kernal_rom)
         # Color RAM
-        self.color_ram = [0x00] * 0x0400 # 1KB
+        self.color_ram = bytearray(0x0400) # 1KB
+
+        # Track memory writes for rewind: one byte per 256-byte page, set to 1 when written.
+        # A fixed buffer avoids the allocation churn of a growing set.
+        self.dirty_pages = bytearray(256)
 
         # Processor port at $0001, controls bank switching.
         self.processor_port = 0x37  # Default power-on state
+        # Row offset into READ_MAP/WRITE_MAP for the current LORAM/HIRAM/CHAREN bits.
+        # Only recomputed when the processor port is written.
+        self.bank_config = (self.processor_port & 0x07) << 8
+
+        # Handlers for every region other than plain RAM, indexed by region tag.
+        self._read_handlers = (
+            None, self._read_basic, self._read_kernal, self._read_char,
+            self._read_vic, self._read_sid, self._read_color, self._read_cia1, self._read_cia2,
+            None, self._read_page0,
+        )
+        self._write_handlers = (
+            None, None, None, None,
+            self._write_vic, self._write_sid, self._write_color, self._write_cia1, self._write_cia2,
+            self._write_rom, self._write_page0,
+        )
 
     def read(self, address):
+        region = READ_MAP[self.bank_config | (address >> 8)]
+        # Plain RAM is by far the most common case, so it skips the dispatch.
+        if region == REGION_RAM:
+            return self.ram[address]
+        return self._read_handlers[region](address)
+
+    def write(self, address, data):
+        # Mark the page as dirty for rewind
+        self.dirty_pages[address >> 8] = 1
+
+        region = WRITE_MAP[self.bank_config | (address >> 8)]
+        if region == REGION_RAM:
+            self.ram[address] = data
+        else:
+            self._write_handlers[region](address, data)
+
+    # --- Region handlers ---
+    def _read_page0(self, address):
         # The processor port at $0000/$0001 has special behavior.
         # Reading $0000 returns the value of the port direction register.
         # Reading $0001 returns the latched value of the port.
@@ -27,96 +144,101 @@ class MemoryManager:
             # The direction register is fixed in the C64.
             return 0x2F # Default value for the 6510's port direction register
         if address == 0x0001:
-            # The value written to $0001 updates the processor port, which controls bank switching.
-            # The write also goes to the underlying RAM.
             return self.processor_port
+        return self.ram[address]
 
-        # Determine memory mapping based on processor port
-        loram = (self.processor_port >> 0) & 1
-        hiram = (self.processor_port >> 1) & 1
-        charen = (self.processor_port >> 2) & 1
+    def _read_basic(self, address):
+        return self.basic_rom[address - 0xA000]
 
-        # The C64 memory map is determined by the combination of these bits
-        # and the address being accessed.
-        # See: https://www.c64-wiki.com/wiki/Bank_Switching
+    def _read_kernal(self, address):
+        return self.kernal_rom[address - 0xE000]
 
-        # $A000-$BFFF: BASIC ROM or RAM
-        if 0xA000 <= address <= 0xBFFF:
-            if loram and hiram:
-                return self.basic_rom[address - 0xA000]
+    def _read_char(self, address):
+        return self.char_rom[address - 0xD000]
 
-        # $D000-$DFFF: I/O, Character ROM, or RAM
-        elif 0xD000 <= address <= 0xDFFF:
-            # When charen is 0, Character ROM is visible.
-            # When charen is 1, I/O is visible.
-            # Both are only visible if either LORAM or HIRAM is also active.
-            if loram or hiram:
-                if charen: # I/O visible
-                    if 0xD000 <= address <= 0xD3FF: return self.bus.vic.read(address)
-                    if 0xD400 <= address <= 0xD7FF: return self.bus.sid.read(address)
-                    if 0xD800 <= address <= 0xDBFF: return self.color_ram[address - 0xD800]
-                    if 0xDC00 <= address <= 0xDCFF: return self.bus.cia1.read(address)
-                    if 0xDD00 <= address <= 0xDDFF: return self.bus.cia2.read(address)
-                else: # Character ROM visible
-                    return self.char_rom[address - 0xD000]
-
-        # $E000-$FFFF: KERNAL ROM or RAM
-        elif 0xE000 <= address <= 0xFFFF:
-            if hiram:
-                return self.kernal_rom[address - 0xE000]
-
-        # If no ROM or I/O was mapped at the given address, fall through to RAM.
-        return self.ram[address]
+    def _read_vic(self, address):
+        return self.bus.vic.read(address)
 
-    def write(self, address, data):
+    def _read_sid(self, address):
+        return self.bus.sid.read(address)
+
+    def _read_color(self, address):
+        return self.color_ram[address - 0xD800]
+
+    def _read_cia1(self, address):
+        return self.bus.cia1.read(address)
+
+    def _read_cia2(self, address):
+        return self.bus.cia2.read(address)
+
+    def _write_page0(self, address, data):
         # The processor port at $0001 is always writable to the RAM underneath.
         # Its value is also latched to control bank switching.
         if address == 0x0001:
-            # The value written to $0001 updates the processor port, which controls bank switching.
-            # The write also goes to the underlying RAM.
-            self.ram[address] = data
             self.processor_port = data
-
-        # Determine memory mapping based on processor port
-        loram = (self.processor_port >> 0) & 1
-        hiram = (self.processor_port >> 1) & 1
-        charen = (self.processor_port >> 2) & 1
-
-        # Writes to ROM areas are ignored if the ROM is banked in.
-        # Otherwise, the write goes to the underlying RAM.
-
-        # $A000-$BFFF: BASIC ROM or RAM
-        if 0xA000 <= address <= 0xBFFF:
-            if loram and hiram:
-                return  # Write is ignored when BASIC ROM is visible
-
-        # $D000-$DFFF: I/O, Character ROM, or RAM
-        elif 0xD000 <= address <= 0xDFFF:
-            if loram or hiram:
-                if charen: # I/O visible
-                    if 0xD000 <= address <= 0xD3FF: self.bus.vic.write(address, data); return
-                    if 0xD400 <= address <= 0xD7FF: self.bus.sid.write(address, data); return
-                    if 0xD800 <= address <= 0xDBFF: self.color_ram[address - 0xD800] = data; return
-                    if 0xDC00 <= address <= 0xDCFF: self.bus.cia1.write(address, data); return
-                    if 0xDD00 <= address <= 0xDDFF: self.bus.cia2.write(address, data); return
-                else: # Character ROM visible
-                    # Writes to Character ROM area go to underlying RAM, except for Color RAM
-                    if 0xD800 <= address <= 0xDBFF:
-                        self.color_ram[address - 0xD800] = data
-                        return
-
-        # $E000-$FFFF: KERNAL ROM or RAM
-        elif 0xE000 <= address <= 0xFFFF:
-            if hiram:
-                return  # Write is ignored when KERNAL ROM is visible
-
-        # Default to RAM write if no other area handled the write.
+            self.bank_config = (data & 0x07) << 8
         self.ram[address] = data
 
+    def _write_rom(self, address, data):
+        pass # Write is ignored when the ROM is visible
+
+    def _write_vic(self, address, data):
+        self.bus.vic.write(address, data)
+
+    def _write_sid(self, address, data):
+        self.bus.sid.write(address, data)
+
+    def _write_color(self, address, data):
+        self.color_ram[address - 0xD800] = data
+
+    def _write_cia1(self, address, data):
+        self.bus.cia1.write(address, data)
+
+    def _write_cia2(self, address, data):
+        self.bus.cia2.write(address, data)
+
+    def read_block(self, start, end):
+        """
+        Returns the bytes in [start, end) as the CPU sees them under the current
+        bank configuration. RAM and ROM pages are copied as slices, the I/O pages
+        and the zero page are read one byte at a time through their handlers.
+        """
+        data = bytearray()
+        address = start
+        while address < end:
+            page_end = min((address | 0xFF) + 1, end)
+            region = READ_MAP[self.bank_config | (address >> 8)]
+            if region == REGION_RAM:
+                data += self.ram[address:page_end]
+            elif region == REGION_BASIC:
+                data += self.basic_rom[address - 0xA000:page_end - 0xA000]
+            elif region == REGION_KERNAL:
+                data += self.kernal_rom[address - 0xE000:page_end - 0xE000]
+            elif region == REGION_CHAR:
+                data += self.char_rom[address - 0xD000:page_end - 0xD000]
+            else:
+                data.extend(self.read(a) & 0xFF for a in range(address, page_end))
+            address = page_end
+        return bytes(data)
+
+    def is_ram_range(self, start, end):
+        """
+        Returns True if every address in [start, end) maps to plain RAM
+        under the current bank configuration, so it can be copied in one slice.
+        """
+        if end > 0x10000 or start >= end:
+            return False
+        for page in range(start >> 8, ((end - 1) >> 8) + 1):
+            if WRITE_MAP[self.bank_config | page] != REGION_RAM:
+                return False
+        return True
+
     def load_rom(self, rom_type, data):
         if rom_type == 'basic':
             self.basic_rom[:len(data)] = data
+            self.basic_words = _decode_words(self.basic_rom)
         elif rom_type == 'kernal':
             self.kernal_rom[:len(data)] = data
+            self.kernal_words = _decode_words(self.kernal_rom)
         elif rom_type == 'char':
             self.char_rom[:len(data)] = data
\ No newline at end of file
@@ -1,21 +1,21 @@
 # pyc64/opcodes.py
 
-from enum import Enum, auto
-
-class Mode(Enum):
-    IMMEDIATE = auto()
-    ZEROPAGE = auto()
-    ZEROPAGEX = auto()
-    ZEROPAGEY = auto()
-    ABSOLUTE = auto()
-    ABSOLUTEX = auto()
-    ABSOLUTEY = auto()
-    IMPLIED = auto()
-    INDIRECT = auto()
-    RELATIVE = auto()
-    ACCUMULATOR = auto()
-    INDIRECTX = auto()
-    INDIRECTY = auto()
+class Mode:
+    """Addressing modes, as plain ints so comparisons and table lookups stay cheap."""
+    IMMEDIATE = 0
+    ZEROPAGE = 1
+    ZEROPAGEX = 2
+    ZEROPAGEY = 3
+    ABSOLUTE = 4
+    ABSOLUTEX = 5
+    ABSOLUTEY = 6
+    IMPLIED = 7
+    INDIRECT = 8
+    RELATIVE = 9
+    ACCUMULATOR = 10
+    INDIRECTX = 11
+    INDIRECTY = 12
+    COUNT = 13
 
 def get_opcode_definitions(cpu):
     """Returns a dictionary mapping opcodes to their implementation."""
@@ -115,6 +115,16 @@ def get_opcode_definitions(cpu):
         0xD3: {"f": cpu.DCP, "m": Mode.INDIRECTY},
     }
 
+# Operand syntax for each addressing mode, for the disassemblers.
+# The field is the operand byte or word; for relative branches it is the target address.
+OPERAND_FORMATS = {
+    Mode.IMMEDIATE: "#${0:02X}", Mode.ZEROPAGE: "${0:02X}",
+    Mode.ZEROPAGEX: "${0:02X},X", Mode.ZEROPAGEY: "${0:02X},Y",
+    Mode.ABSOLUTE: "${0:04X}", Mode.ABSOLUTEX: "${0:04X},X", Mode.ABSOLUTEY: "${0:04X},Y",
+    Mode.IMPLIED: "", Mode.INDIRECT: "(${0:04X})", Mode.RELATIVE: "${0:04X}",
+    Mode.ACCUMULATOR: "", Mode.INDIRECTX: "(${0:02X},X)", Mode.INDIRECTY: "(${0:02X}),Y",
+}
+
 CYCLE_COUNTS = {
     0x00: 7, 0x01: 6, 0x05: 3, 0x06: 5, 0x07: 5, 0x08: 3, 0x09: 2, 0x0A: 2, 0x0D: 4, 0x0E: 6,
     0x10: 2, 0x11: 5, 0x15: 4, 0x16: 6, 0x17: 6, 0x18: 2, 0x19: 4, 0x1D: 4, 0x1E: 7, 0x20: 6,
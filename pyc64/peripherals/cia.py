@@ -25,24 +25,61 @@ C64_KEY_MAP = {
     pygame.K_HOME: (7, 7), # C64 CLR/HOME
 }
 
+def c64_key_index(key):
+    """
+    Folds a pygame key code into an index for C64_KEY_LUT.
+    SDL key codes are either plain character codes or scancodes (< 512) with bit 30 set.
+    Any other code, such as a Unicode character at or above 0x200, maps to index 0
+    (K_UNKNOWN), which is never mapped.
+    """
+    if key & ~0x400001FF:
+        return 0
+    return ((key >> 21) & 0x200) | (key & 0x1FF)
+
+# Flat reverse map of C64_KEY_MAP built once at import, indexed by c64_key_index(key).
+# Each entry is (row << 3) | col, or 0xFF if the key is not mapped.
+C64_KEY_LUT = bytearray(b'\xff' * 1024)
+for _key, (_row, _col) in C64_KEY_MAP.items():
+    C64_KEY_LUT[c64_key_index(_key)] = (_row << 3) | _col
+del _key, _row, _col
+
+# For each possible Port A value, a 64-bit mask with byte `col` set to 0xFF when
+# keyboard column `col` is NOT selected (its bit in Port A is 1, columns are active low).
+UNSELECTED_COLUMN_MASKS = tuple(
+    sum(0xFF << (col * 8) for col in range(8) if (port_a >> col) & 1)
+    for port_a in range(256)
+)
+
 class CIA:
+    # Fixed attribute layout: faster attribute access and a smaller instance.
+    __slots__ = (
+        'name', 'registers', 'is_cia1', 'cpu',
+        'key_bits', 'port_a_output', 'port_b_output', 'ddra', 'ddrb', 'joystick_state',
+        'timer_a_latch', 'timer_b_latch', 'timer_a_counter', 'timer_b_counter',
+        'cra', 'crb', 'icr', 'ifr', '_timer_a_irq_enabled',
+        'timer_a_started',
+    )
+    # Everything except the CPU reference is part of the saved state
+    _SAVE_KEYS = tuple(key for key in __slots__ if key != 'cpu')
+
     def __init__(self, name="CIA", is_cia1=False, cpu=None):
         self.name = name
         self.registers = [0x00] * 16
         self.is_cia1 = is_cia1
         self.cpu = cpu
 
-        # CIA1 specific for keyboard
-        if self.is_cia1:
-            # Keyboard matrix: 8 rows, 8 columns.
-            # Each element is 1 (not pressed) or 0 (pressed).
-            # Initialized to all 1s (no keys pressed).
-            self.keyboard_matrix = [[1 for _ in range(8)] for _ in range(8)]
-            self.port_a_output = 0xFF # Output to keyboard columns (active low)
-            self.port_b_output = 0xFF # Output to keyboard rows (active low)
-            self.ddra = 0x00 # Data Direction Register A (0=input, 1=output)
-            self.ddrb = 0x00 # Data Direction Register B
-            self.joystick_state = 0xFF # Bits 0-4 for Joystick 2 (Up, Down, Left, Right, Fire)
+        # Port state. Only CIA1 uses it, for the keyboard and joystick, but it is
+        # set on both chips so every instance has the same attributes.
+        # Keyboard matrix: 8 rows, 8 columns, packed into one 64-bit int.
+        # Bit (col * 8 + row) is 1 (not pressed) or 0 (pressed), so byte `col`
+        # holds the row mask of that column.
+        # Initialized to all 1s (no keys pressed).
+        self.key_bits = 0xFFFFFFFFFFFFFFFF
+        self.port_a_output = 0xFF # Output to keyboard columns (active low)
+        self.port_b_output = 0xFF # Output to keyboard rows (active low)
+        self.ddra = 0x00 # Data Direction Register A (0=input, 1=output)
+        self.ddrb = 0x00 # Data Direction Register B
+        self.joystick_state = 0xFF # Bits 0-4 for Joystick 2 (Up, Down, Left, Right, Fire)
 
         # Timer state
         self.timer_a_latch = 0x0000
@@ -57,6 +94,8 @@ class CIA:
         # Interrupt Control
         self.icr = 0x00 # Interrupt Control Register (mask)
         self.ifr = 0x00 # Interrupt Flag Register (source)
+        # Timer A mask bit cached as a bool, updated whenever the ICR is written
+        self._timer_a_irq_enabled = False
 
         self.timer_a_started = False
 
@@ -74,18 +113,14 @@ class CIA:
                 # Initialize result with all bits set (no keys pressed)
                 result = 0xFF
 
-                # Iterate through each column bit in port_a_output
-                for col_idx in range(8):
-                    # If the column is selected (bit is 0 in port_a_output)
-                    if not ((self.port_a_output >> col_idx) & 1):
-                        # OR the row states for this column into the result
-                        # If any key in this column is pressed (matrix value is 0),
-                        # the corresponding row bit in 'result' should be 0.
-                        row_state_for_col = 0xFF
-                        for row_idx in range(8):
-                            if self.keyboard_matrix[row_idx][col_idx] == 0:
-                                row_state_for_col &= ~(1 << row_idx) # Set bit to 0 if key pressed
-                        result &= row_state_for_col
+                # A column is selected when its bit is 0 in port_a_output.
+                # Force the unselected columns to 0xFF, then AND all 8 column bytes
+                # together by folding the 64-bit value in half three times.
+                keys = self.key_bits | UNSELECTED_COLUMN_MASKS[self.port_a_output & 0xFF]
+                keys &= keys >> 32
+                keys &= keys >> 16
+                keys &= keys >> 8
+                result &= keys & 0xFF
                 
                 # Apply DDR A (Data Direction Register A)
                 # Bits set to 0 in DDRA are inputs, so their values come from the keyboard.
@@ -158,6 +193,7 @@ class CIA:
                 self.icr |= (data & 0x7F)
             else:
                 self.icr &= ~(data & 0x7F)
+            self._timer_a_irq_enabled = bool(self.icr & 0b00000001)
             # Add other CIA1 registers as needed
         
         # Default for other CIAs or unimplemented registers
@@ -167,7 +203,11 @@ class CIA:
     def set_key_state(self, row, col, pressed):
         """Updates the state of a key in the keyboard matrix."""
         if self.is_cia1 and 0 <= row < 8 and 0 <= col < 8:
-            self.keyboard_matrix[row][col] = 0 if pressed else 1
+            bit = 1 << (col * 8 + row)
+            if pressed:
+                self.key_bits &= ~bit
+            else:
+                self.key_bits |= bit
 
     def set_joystick_state(self, direction_bit, pressed):
         """Updates the state of a joystick direction or fire button."""
@@ -176,26 +216,40 @@ class CIA:
         else:
             self.joystick_state |= (1 << direction_bit) # Set bit
 
-    def tick(self):
-        """Clock the CIA timers. This should be called once per CPU cycle."""
+    def tick(self, cycles=1):
+        """
+        Clock the CIA timers by a number of CPU cycles.
+        The counters are fast-forwarded in one step, so the CPU can call this
+        once per instruction instead of once per cycle.
+        """
         # --- Timer A ---
+        # The counter is an unsigned 16-bit value. It underflows on the cycle
+        # that finds it at zero, then reloads from the latch.
         if self.timer_a_started:
-            self.timer_a_counter -= 1
-            if self.timer_a_counter < 0: # Underflow condition
-                # Underflow occurred
-                self.ifr |= 0b00000001 # Set Timer A interrupt flag
-
-                # Check if this interrupt is enabled in the mask
-                if self.icr & 0b00000001:
-                    self.ifr |= 0x80 # Set the main interrupt flag
-                    if self.cpu and (self.icr & 0x80): # Check master interrupt bit
-                        self.cpu.irq()
-
-                # Check run mode (bit 3 of CRA)
-                if self.cra & 0b00001000: # One-shot mode
-                    self.timer_a_started = False
-                else: # Continuous mode
-                    self.timer_a_counter = self.timer_a_latch # Reload and continue
+            counter = self.timer_a_counter
+            if cycles <= counter:
+                self.timer_a_counter = counter - cycles
+                return
+
+            # Underflow occurred
+            ifr = self.ifr | 0b00000001 # Set Timer A interrupt flag
+
+            # Check if this interrupt is enabled in the mask
+            if self._timer_a_irq_enabled:
+                ifr |= 0x80 # Set the main interrupt flag
+                if self.cpu and (self.icr & 0x80): # Check master interrupt bit
+                    self.cpu.irq()
+            self.ifr = ifr
+
+            # Check run mode (bit 3 of CRA)
+            if self.cra & 0b00001000: # One-shot mode
+                # Reload and stop
+                self.timer_a_started = False
+                self.timer_a_counter = self.timer_a_latch
+            else: # Continuous mode
+                # Reload and continue; the timer runs for latch + 1 cycles between underflows
+                remaining = (cycles - counter - 1) % (self.timer_a_latch + 1)
+                self.timer_a_counter = self.timer_a_latch - remaining
 
         # --- Timer B ---
         # (Implementation would be very similar to Timer A, using CRB)
@@ -203,13 +257,14 @@ class CIA:
 
     def save_state(self):
         """Saves the CIA's state to a dictionary."""
-        # Exclude the CPU reference from being saved
-        state = {k: v for k, v in vars(self).items() if k != 'cpu'}
-        return state
+        return {key: getattr(self, key) for key in self._SAVE_KEYS}
 
     def restore_state(self, state):
         """Restores the CIA's state from a dictionary."""
-        # The CPU reference is restored separately by the Bus
-        for key, value in state.items():
-            if key != 'cpu':
-                setattr(self, key, value)
\ No newline at end of file
+        # The CPU reference is restored separately by the Bus.
+        # Keys from older save files that are no longer attributes are skipped.
+        for key in self._SAVE_KEYS:
+            if key in state:
+                setattr(self, key, state[key])
+        # Keep the cached mask bit in sync with the restored ICR
+        self._timer_a_irq_enabled = bool(self.icr & 0b00000001)
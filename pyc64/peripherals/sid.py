@@ -219,9 +219,13 @@ class SID:
         elif reg == 6: # Sustain/Release
             voice.sustain_release = data
 
-    def generate_audio_buffer(self, length):
-        """Generates a buffer of audio samples."""
-        buffer = np.zeros(length, dtype=np.int16)
+    def generate_audio_buffer(self, length, out=None):
+        """
+        Generates a buffer of audio samples.
+        If out is given, the samples are written into it and it is returned. An out of
+        shape (length, channels) gets the same sample in every channel.
+        """
+        buffer = np.zeros(length, dtype=np.int16) if out is None else out
         max_amplitude = 32767 * self.volume / 3.0 # Divide by 3 to prevent clipping
 
         # Calculate filter coefficients once per buffer
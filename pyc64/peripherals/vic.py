@@ -1,5 +1,6 @@
 # Placeholder for the MOS Technology VIC-II (Video Interface Chip)
 import pygame
+import numpy as np
 
 class Sprite:
     """A helper class to manage the state of a single C64 sprite."""
@@ -37,9 +38,14 @@ class VICII:
         # Internal state
         self.cycle = 0
         self.raster_line = 0
+        # Result of is_badline() for the current raster position. It only changes
+        # on a new raster line or a register write, so it is not recomputed every cycle.
+        self.badline = False
 
         # Screen buffer
         self.screen_surface = pygame.Surface((self.VISIBLE_WIDTH, self.VISIBLE_HEIGHT))
+        # Set when a pixel is drawn. The GUI clears it once it has scaled the screen.
+        self.frame_dirty = True
 
         # Sprite data
         self.sprites = [Sprite(i) for i in range(8)]
@@ -57,15 +63,21 @@ class VICII:
             (221, 136, 85), (102, 68, 0), (255, 119, 119), (51, 51, 51),
             (119, 119, 119), (170, 255, 102), (0, 136, 255), (187, 187, 187)
         ]
+        # The palette as pixel values of screen_surface, so set_at() does not convert a tuple per pixel
+        self.palette_mapped = [self.screen_surface.map_rgb(color) for color in self.palette]
 
         # Character ROM data
         self.char_rom = [0x00] * 0x1000 # 4KB
+        # Every character ROM bit unpacked to one byte, indexed by (address << 3) | column.
+        # Rebuilt by load_char_rom().
+        self.char_pixels = bytes(0x1000 * 8)
 
     def load_char_rom(self, filename="char.rom"):
         """Loads the character ROM."""
         try:
             with open(filename, 'rb') as f:
                 self.char_rom = list(f.read(0x1000))
+            self.char_pixels = np.unpackbits(np.array(self.char_rom, dtype=np.uint8)).tobytes()
             print(f"Character ROM '{filename}' loaded.")
         except FileNotFoundError:
             print(f"Warning: Character ROM '{filename}' not found. Text will not be rendered correctly.")
@@ -139,10 +151,19 @@ class VICII:
             sprite_id = addr - 0x27
             self.sprites[sprite_id].color = data & 0x0F
 
+        # $D011, sprite Y positions and sprite enables all affect badlines
+        self.badline = self.is_badline()
+
     def tick(self):
-        """Simulates one VIC-II cycle. This should be called for every CPU cycle."""
-        # The render_pixel method must be called on every cycle to correctly handle border/screen logic.
-        self.render_pixel()
+        """
+        Simulates one VIC-II cycle. This should be called for every CPU cycle.
+        Returns True if the CPU is on a badline after this cycle.
+        """
+        # Only cycles inside the visible screen area draw a pixel, the border is not rendered.
+        if (0 <= self.cycle - self.X_SCROLL_OFFSET < self.VISIBLE_WIDTH
+                and 0 <= self.raster_line - self.Y_SCROLL_OFFSET < self.VISIBLE_HEIGHT):
+            self.render_pixel()
+            self.frame_dirty = True
 
         # Advance raster position
         self.cycle += 1
@@ -162,19 +183,16 @@ class VICII:
             if self.raster_line >= self.SCREEN_HEIGHT_RASTER:
                 self.raster_line = 0
 
+            self.badline = self.is_badline()
+
+        return self.badline
+
     def render_pixel(self):
-        """Renders a single pixel to the screen buffer."""
+        """Renders a single pixel to the screen buffer. tick() only calls it inside the visible area."""
         # Calculate pixel coordinates relative to the visible screen area
         y_screen = self.raster_line - self.Y_SCROLL_OFFSET
         x_screen = self.cycle - self.X_SCROLL_OFFSET
 
-        # If the current raster position is outside the visible 320x200 screen,
-        # it's considered the border. We draw the border color and stop.
-        if not (0 <= x_screen < self.VISIBLE_WIDTH and 0 <= y_screen < self.VISIBLE_HEIGHT):
-            border_color_idx = self.registers[0x20] & 0x0F
-            # The screen_surface is 320x200, so we can't draw outside it. This return is correct.
-            return
-
         # --- Get current scroll values ---
         # Horizontal scroll (bits 0-2 of $D016)
         h_scroll = self.registers[0x16] & 0x07
@@ -248,14 +266,13 @@ class VICII:
             # Get character bitmap data from Character ROM
             char_rom_base = ((vic_mem_pointers >> 1) & 0b111) * 0x800 # 2KB blocks
             char_bitmap_addr = (screen_code * 8) + (logical_y_pixel % 8)
-            char_bitmap_byte = self.char_rom[char_bitmap_addr]
 
             # Get color from Color RAM
             color_ram_base = 0xD800
             color_idx = self.bus.read(color_ram_base + (char_row * 40) + char_col) & 0x0F
 
             # Is the current pixel set in the character bitmap?
-            char_pixel_is_set = (char_bitmap_byte >> (7 - (logical_x_pixel % 8))) & 1
+            char_pixel_is_set = self.char_pixels[(char_bitmap_addr << 3) | (logical_x_pixel & 7)]
 
             if char_pixel_is_set:
                 final_background_color_idx = color_idx
@@ -285,7 +302,7 @@ class VICII:
             else: # Sprite is in front of background
                 final_pixel_color_idx = sprite_color_idx
         
-        self.screen_surface.set_at((x_screen, y_screen), self.palette[final_pixel_color_idx])
+        self.screen_surface.set_at((x_screen, y_screen), self.palette_mapped[final_pixel_color_idx])
 
     def trigger_interrupt(self, flag):
         """Sets an interrupt flag and triggers an IRQ if the mask allows it."""
@@ -444,4 +461,5 @@ class VICII:
             s_state = sprite_states[i]
             self.sprites[i] = Sprite(s_state['id'])
             for key, value in s_state.items():
-                setattr(self.sprites[i], key, value)
\ No newline at end of file
+                setattr(self.sprites[i], key, value)
+        self.badline = self.is_badline()
\ No newline at end of file
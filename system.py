@@ -22,10 +22,14 @@ print(f"CPU PC set to C64 KERNAL reset vector: ${cpu.pc:04X}")
 # cpu.pc = 0x0400 # Test entry point
 # print("Loaded 6502_functional_test.bin, entry point at $0400")
 # success_address = 0x3469 # Test success address
-# cpu.breakpoints.add(success_address)
+# cpu.add_breakpoint(success_address)
 # print(f"A breakpoint is set at the success address: ${success_address:04X}.")
 
 print(f"Starting C64 emulation...")
 
-while True:
-    cpu.tick()
+try:
+    while True:
+        cpu.tick()
+finally:
+    # Write out whatever the instruction trace still holds in its buffer
+    cpu.close_trace()